@@ -0,0 +1,132 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.renderers import JSONRenderer
+
+
+def run(function, *args, **kwargs):
+    """Выполняет синхронную функцию в пуле потоков.
+
+    ORM в Django 3.2 синхронный, поэтому асинхронные вьюхи обращаются к
+    базе из потоков. Вызов не привязан к общему потоку sync_to_async,
+    так что запросы разных клиентов выполняются одновременно. Каждый
+    поток держит своё соединение, которое после вызова закрывается или
+    остаётся открытым по правилам CONN_MAX_AGE.
+    """
+    def call():
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+def gather(*calls):
+    """Одновременно выполняет независимые вызовы (функция, *аргументы)."""
+    return asyncio.gather(*(run(*call) for call in calls))
+
+
+def set_prefetched(instance, name, objects):
+    """Сохраняет выбранные заранее объекты связи, как prefetch_related."""
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
+
+
+class AsyncReadMixin:
+    """Асинхронное чтение для развёртывания под ASGI.
+
+    При ASYNC_READ_VIEWS as_view возвращает асинхронную вьюху. GET и HEAD
+    действий из async_actions выполняются в пуле потоков и не ждут
+    общего потока, через который Django 3.2 пропускает синхронные вьюхи.
+    Если у действия есть метод async_<действие>, запрос обрабатывается
+    в цикле событий, а независимые данные выбираются одновременно.
+    Остальные запросы передаются обычной вьюхе DRF.
+    """
+    async_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_READ_VIEWS or not any(
+            action in cls.async_actions for action in actions.values()
+        ):
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            actions = view.actions
+            if 'get' in actions and 'head' not in actions:
+                actions['head'] = actions['get']
+            action = actions.get(request.method.lower())
+            if (
+                request.method not in ('GET', 'HEAD')
+                or action not in cls.async_actions
+            ):
+                return await sync_view(request, *args, **kwargs)
+            if not hasattr(cls, f'async_{action}'):
+                return await run(view, request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, name in actions.items():
+                setattr(self, method, getattr(self, name))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.async_dispatch(request, *args, **kwargs)
+
+        async_view.__name__ = view.__name__
+        async_view.__doc__ = view.__doc__
+        async_view.cls = cls
+        async_view.initkwargs = initkwargs
+        async_view.actions = view.actions
+        async_view.csrf_exempt = True
+        return async_view
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        """Асинхронный аналог APIView.dispatch."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await run(self.initial, request, *args, **kwargs)
+            handler = getattr(self, f'async_{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        renderer = getattr(self.response, 'accepted_renderer', None)
+        if renderer is None:
+            # Готовые ответы Django, например 304 условного запроса.
+            return self.response
+        if isinstance(renderer, JSONRenderer):
+            return self.response.render()
+        return await run(self.response.render)
+
+    async def async_paginated_list(self, request):
+        """Асинхронный аналог ListModelMixin.list.
+
+        COUNT и выборка страницы выполняются одновременно, если это
+        позволяет пагинатор.
+        """
+        queryset = await run(
+            lambda: self.filter_queryset(self.get_queryset())
+        )
+        page = await self.paginator.async_paginate_queryset(
+            queryset, request, view=self
+        )
+        data = await run(
+            lambda: self.get_serializer(page, many=True).data
+        )
+        return self.get_paginated_response(data)
@@ -0,0 +1,196 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from foodgram.db.replicas import replica_may_lag
+from foodgram.versions import get_versions
+from .asynchronous import run
+
+
+def normalize_query(params):
+    """Возвращает параметры запроса в порядке, не зависящем от клиента.
+
+    Значения сравниваются после декодирования, поэтому одинаковые
+    запросы под WSGI и ASGI получают один ключ.
+    """
+    return '&'.join(
+        f'{name}={",".join(sorted(params.getlist(name)))}'
+        for name in sorted(params)
+    )
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы по версиям ресурсов.
+
+    ETag строится из версий ресурсов cache_resources, пути запроса с
+    нормализованными параметрами и формата ответа. Если ответ зависит от
+    пользователя, в ETag добавляется версия его избранного, корзины и
+    подписок. Пока реплика, с которой
+    читает запрос, может не знать о последнем изменении, ETag не
+    выдаётся, чтобы клиент не закэшировал старые данные под новой версией.
+    """
+    cache_resources = ()
+    cache_user_state = False
+    conditional_actions = ('list', 'retrieve')
+    cache_validators = None
+
+    def get_cache_validators(self, request):
+        """Возвращает ETag и время последнего изменения ответа или None."""
+        names = list(self.cache_resources)
+        user = request.user
+        personal = self.cache_user_state and user.is_authenticated
+        if personal:
+            names.append(f'user:{user.id}')
+        versions = get_versions(*names)
+        if replica_may_lag(max(versions.values())):
+            return None
+        key = '|'.join([
+            request.path,
+            normalize_query(request.query_params),
+            request.accepted_renderer.format,
+            str(user.id) if personal else '',
+            *(str(versions[name]) for name in names),
+        ])
+        etag = '"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+        return etag, max(versions.values()) // 10 ** 9
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.cache_validators = None
+        if (
+            request.method in ('GET', 'HEAD')
+            and self.action in self.conditional_actions
+        ):
+            self.cache_validators = self.get_cache_validators(request)
+            if self.cache_validators is None:
+                return
+            etag, last_modified = self.cache_validators
+            response = get_conditional_response(
+                request._request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.cache_validators and response.status_code in (200, 304):
+            etag, last_modified = self.cache_validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response, public=True,
+                    max_age=settings.HTTP_CACHE_MAX_AGE
+                )
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class CachedListMixin:
+    """Кэширование анонимной выдачи списка на стороне сервера.
+
+    Ключ кэша включает нормализованные параметры запроса и версии
+    ресурсов list_cache_resources, поэтому любое изменение рецептов,
+    тегов или ингредиентов делает старые записи недоступными. Для
+    авторизованных пользователей поверх сохранённого ответа
+    проставляются только их персональные флаги, а сам ответ строится
+    как для анонимного пользователя (shared_response). Ответ, прочитанный
+    с реплики вскоре после изменения, хранится не дольше REPLICA_MAX_LAG
+    секунд (list_cache_timeout): реплика могла его ещё не получить.
+    """
+    list_cache_resources = ()
+    list_cache_timeout = DEFAULT_TIMEOUT
+    list_cache_bypass_params = ()
+    shared_response = False
+
+    def get_list_cache_key(self, request):
+        """Возвращает ключ кэша списка или None, если кэш неприменим."""
+        params = request.query_params
+        if any(param in params for param in self.list_cache_bypass_params):
+            return None
+        versions = get_versions(*self.list_cache_resources)
+        self.list_cache_timeout = (
+            settings.REPLICA_MAX_LAG
+            if replica_may_lag(max(versions.values())) else DEFAULT_TIMEOUT
+        )
+        key = '|'.join([
+            request.build_absolute_uri(request.path),
+            request.accepted_renderer.format,
+            normalize_query(params),
+            *(str(versions[name]) for name in self.list_cache_resources),
+        ])
+        return 'list:{}:{}'.format(
+            self.basename, hashlib.md5(key.encode()).hexdigest()
+        )
+
+    def overlay_user_data(self, data, user):
+        """Дополняет общий ответ персональными данными пользователя."""
+        return data
+
+    async def async_overlay_user_data(self, data, user):
+        """Асинхронный аналог overlay_user_data."""
+        return await run(self.overlay_user_data, data, user)
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        data = cache.get(key)
+        if data is None:
+            self.shared_response = True
+            try:
+                response = super().list(request, *args, **kwargs)
+            finally:
+                self.shared_response = False
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, self.list_cache_timeout)
+        if request.user.is_authenticated:
+            data = self.overlay_user_data(data, request.user)
+        return Response(data)
+
+    async def async_list(self, request, *args, **kwargs):
+        """Асинхронный аналог list для AsyncReadMixin."""
+        key = await run(self.get_list_cache_key, request)
+        if key is None:
+            return await self.async_paginated_list(request)
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        data = await run(cache.get, key)
+        if data is None:
+            self.shared_response = True
+            try:
+                response = await self.async_paginated_list(request)
+            finally:
+                self.shared_response = False
+            if response.status_code != 200:
+                return response
+            data = response.data
+            await run(cache.set, key, data, self.list_cache_timeout)
+        if request.user.is_authenticated:
+            data = await self.async_overlay_user_data(data, request.user)
+        return Response(data)
@@ -0,0 +1,133 @@
+import base64
+import binascii
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from rest_framework import serializers
+
+BASE64_HEADER = ';base64,'
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+PLAIN_NAME = re.compile(r'(?:[A-Za-z0-9_-]+/)*[A-Za-z0-9_-]+\.[A-Za-z0-9]+')
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Изображение в base64, декодируемое по частям во временный файл.
+
+    Декодированные данные не хранятся в памяти целиком: Pillow проверяет
+    файл на диске, а хранилище перемещает его на место без копирования.
+    """
+    CHUNK_SIZE = 64 * 1024
+    TOO_LARGE_MESSAGE = 'Размер изображения превышает {}.'
+    TOO_MANY_PIXELS_MESSAGE = 'Разрешение изображения слишком велико.'
+
+    def decode(self, base64_data, offset, target):
+        """Декодирует base64_data начиная с offset в файл target."""
+        tail = ''
+        for start in range(offset, len(base64_data), self.CHUNK_SIZE):
+            chunk = tail + NOT_BASE64.sub(
+                '', base64_data[start:start + self.CHUNK_SIZE]
+            )
+            end = len(chunk) - len(chunk) % 4
+            target.write(base64.b64decode(chunk[:end], validate=True))
+            tail = chunk[end:]
+        if tail:
+            raise ValueError('Неполный блок base64')
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            return super().to_internal_value(base64_data)
+
+        content_type = None
+        offset = base64_data.find(BASE64_HEADER, 0, 256)
+        if offset >= 0:
+            if self.trust_provided_content_type:
+                content_type = base64_data[:offset].replace('data:', '')
+            offset += len(BASE64_HEADER)
+        else:
+            offset = 0
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if (len(base64_data) - offset) // 4 * 3 > max_size:
+            raise ValidationError(
+                self.TOO_LARGE_MESSAGE.format(filesizeformat(max_size))
+            )
+
+        upload = TemporaryUploadedFile(
+            self.get_file_name(None), content_type, 0, None
+        )
+        try:
+            self.decode(base64_data, offset, upload)
+            upload.size = upload.tell()
+            upload.seek(0)
+            extension = self.get_file_extension(
+                upload.name, upload.read(8192)
+            )
+        except (TypeError, binascii.Error, ValueError, ValidationError):
+            upload.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        if extension not in self.ALLOWED_TYPES:
+            upload.close()
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        upload.name = f'{upload.name}.{extension}'
+        upload.seek(0)
+
+        try:
+            image_file = super(Base64FieldMixin, self).to_internal_value(
+                upload
+            )
+            width, height = image_file.image.size
+            if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                raise ValidationError(self.TOO_MANY_PIXELS_MESSAGE)
+        except (ValidationError, serializers.ValidationError):
+            upload.close()
+            raise
+        return image_file
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """Адреса уменьшенных копий изображения рецепта по форматам."""
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        build_url = (
+            request.build_absolute_uri if request is not None
+            else lambda url: url
+        )
+        return {
+            name: {
+                image_format: build_url(default_storage.url(path))
+                for image_format, path in formats.items()
+            }
+            for name, formats in renditions.items()
+        }
+
+
+class MediaUrls:
+    """Абсолютные адреса файлов хранилища в ответе на один запрос.
+
+    Адрес каталога хранилища вычисляется один раз. Имена из латинских
+    букв, цифр, «_» и «-» не меняются ни urljoin, ни build_absolute_uri,
+    поэтому их адрес получается дописыванием имени к адресу каталога.
+    Остальные имена обрабатываются обычным путём.
+    """
+
+    def __init__(self, storage, request):
+        self.storage = storage
+        self.request = request
+        self.prefix = self.build(storage.url(''))
+
+    def build(self, url):
+        if self.request is None:
+            return url
+        return self.request.build_absolute_uri(url)
+
+    def __call__(self, name):
+        if PLAIN_NAME.fullmatch(name):
+            return self.prefix + name
+        return self.build(self.storage.url(name))
@@ -0,0 +1,300 @@
+import base64
+import io
+import json
+import statistics
+import time
+from itertools import cycle
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipes, Recipe, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+HOST = 'testserver'
+
+
+class QueryCounter:
+    """Считает SQL-запросы, выполненные во время запроса к API."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def get_image():
+    """Возвращает небольшое изображение в base64 для создания рецепта."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#49B64E').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def get_viewer():
+    """Возвращает активного пользователя с подписками и корзиной."""
+    viewer = User.objects.annotate(
+        subscriptions_total=Count('subscriber', distinct=True),
+        cart_total=Count('cart', distinct=True),
+    ).filter(
+        subscriptions_total__gt=0, cart_total__gt=0
+    ).order_by('-subscriptions_total', 'id').first()
+    if viewer is None:
+        raise CommandError(
+            'Нет пользователя с подписками и корзиной, выполните '
+            'generate_fake_data.'
+        )
+    return viewer
+
+
+def summarize(timings, queries, elapsed):
+    """Возвращает задержки в мс, число запросов и пропускную способность."""
+    timings = [timing * 1000 for timing in timings]
+    return {
+        'requests': len(timings),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(
+            statistics.quantiles(timings, n=20, method='inclusive')[-1]
+            if len(timings) > 1 else timings[0],
+            3
+        ),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет типовые запросы к API через полный стек Django и DRF '
+        'в текущем процессе и сообщает p50/p95, число SQL-запросов и '
+        'пропускную способность. Данные берутся из базы, например после '
+        'generate_fake_data; изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Количество замеряемых запросов в каждом сценарии.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Количество запросов для прогрева перед замером.'
+        )
+        parser.add_argument(
+            '--scenario',
+            nargs='+',
+            help='Запустить только перечисленные сценарии.'
+        )
+        parser.add_argument(
+            '--keep-cache',
+            action='store_true',
+            help='Не очищать кэш ответов перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--json',
+            help='Сохранить результаты в файл JSON.'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Сравнить с результатами из файла JSON.'
+        )
+
+    def get_scenarios(self, viewer):
+        """Описывает сценарии: имя, клиент, метод, адреса и данные."""
+        recipe_ids = list(
+            Recipe.objects.order_by('-favorites_count', 'id').values_list(
+                'id', flat=True
+            )[:100]
+        )
+        tags = list(Tag.objects.values_list('id', 'slug')[:2])
+        author_id = User.objects.order_by(
+            '-recipes_count', 'id'
+        ).values_list('id', flat=True)[0]
+        ingredients = list(
+            IngredientRecipes.objects.values('ingredient').annotate(
+                total=Count('id')
+            ).order_by('-total', 'ingredient').values_list(
+                'ingredient', flat=True
+            )[:3]
+        )
+        word = Ingredient.objects.get(pk=ingredients[0]).name.split()[0]
+        last_page = max(
+            Recipe.objects.count() // settings.REST_FRAMEWORK['PAGE_SIZE'], 1
+        )
+        own_recipe = Recipe.objects.filter(author=viewer).first()
+        if own_recipe is None:
+            own_recipe = Recipe.objects.first()
+            own_recipe.author = viewer
+            own_recipe.save()
+        if not recipe_ids or len(tags) < 1 or len(ingredients) < 3:
+            raise CommandError(
+                'Недостаточно данных, выполните generate_fake_data.'
+            )
+        ingredients_query = ','.join(str(pk) for pk in ingredients)
+        recipe_payload = {
+            'tags': [tag_id for tag_id, _ in tags],
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredients
+            ],
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 20,
+        }
+        slugs = '&'.join(f'tags={slug}' for _, slug in tags)
+        return [
+            ('recipe-list-anon', False, 'get', ['/api/recipes/'], None),
+            ('recipe-list', True, 'get', ['/api/recipes/'], None),
+            ('recipe-list-tags', True, 'get', [f'/api/recipes/?{slugs}'],
+             None),
+            ('recipe-list-favorited', True, 'get',
+             ['/api/recipes/?is_favorited=1'], None),
+            ('recipe-list-author', True, 'get',
+             [f'/api/recipes/?author={author_id}'], None),
+            ('recipe-list-search', True, 'get',
+             [f'/api/recipes/?search={word}'], None),
+            ('recipe-list-ingredients', True, 'get',
+             [f'/api/recipes/?ingredients_any={ingredients_query}'], None),
+            ('recipe-list-popular', True, 'get',
+             ['/api/recipes/?ordering=popular'], None),
+            ('recipe-list-last-page', True, 'get',
+             [f'/api/recipes/?page={last_page}'], None),
+            ('recipe-detail', True, 'get',
+             [f'/api/recipes/{pk}/' for pk in recipe_ids], None),
+            ('user-subscriptions', True, 'get',
+             ['/api/users/subscriptions/?recipes_limit=3'], None),
+            ('recipe-download-shopping-cart', True, 'get',
+             ['/api/recipes/download_shopping_cart/'], None),
+            ('ingredient-search', True, 'get',
+             [f'/api/ingredients/?name={word[:3]}'], None),
+            ('recipe-create', True, 'post', ['/api/recipes/'],
+             {**recipe_payload, 'image': get_image()}),
+            ('recipe-update', True, 'patch',
+             [f'/api/recipes/{own_recipe.id}/'], recipe_payload),
+        ]
+
+    def run_scenario(self, client, method, urls, payload, options):
+        """Выполняет запросы сценария и собирает замеры."""
+        urls = cycle(urls)
+        timings, queries = [], []
+        total = options['warmup'] + options['requests']
+        elapsed = 0
+        for index in range(total):
+            if not options['keep_cache']:
+                caches[settings.RESPONSE_CACHE_ALIAS].clear()
+            if payload is not None and 'ingredients' in payload:
+                payload = {
+                    **payload,
+                    'ingredients': [
+                        {**ingredient, 'amount': index + 1}
+                        for ingredient in payload['ingredients']
+                    ],
+                }
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                if payload is None:
+                    response = getattr(client, method)(next(urls))
+                else:
+                    response = getattr(client, method)(
+                        next(urls), payload, format='json'
+                    )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            duration = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} вернул {response.status_code}: '
+                    f'{response.content[:500]!r}'
+                )
+            if index >= options['warmup']:
+                timings.append(duration)
+                queries.append(counter.queries)
+                elapsed += duration
+        return summarize(timings, queries, elapsed)
+
+    def get_dataset(self):
+        """Возвращает размеры таблиц, на которых проводился замер."""
+        return {
+            model._meta.model_name: model.objects.count()
+            for model in (
+                User, Recipe, IngredientRecipes, Ingredient, Tag,
+                Favorite, ShoppingCart, Subscription,
+            )
+        }
+
+    def report(self, results, baseline):
+        """Выводит таблицу результатов и сравнение с базовым замером."""
+        header = (
+            f'{"сценарий":<30} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"SQL":>6} {"зап/с":>8}'
+        )
+        if baseline:
+            header += f' {"Δp50":>8} {"ΔSQL":>6}'
+        self.stdout.write(header)
+        for name, result in results['scenarios'].items():
+            line = (
+                f'{name:<30} {result["p50_ms"]:>9.2f} '
+                f'{result["p95_ms"]:>9.2f} {result["queries"]:>6.1f} '
+                f'{result["throughput_rps"]:>8.1f}'
+            )
+            previous = baseline.get(name)
+            if previous:
+                change = result['p50_ms'] / previous['p50_ms'] - 1
+                line += (
+                    f' {change:>+8.0%} '
+                    f'{result["queries"] - previous["queries"]:>+6.1f}'
+                )
+            self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)['scenarios']
+        results = {
+            'dataset': self.get_dataset(),
+            'settings': {
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'keep_cache': options['keep_cache'],
+                'database': connection.vendor,
+            },
+            'scenarios': {},
+        }
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[HOST]):
+            viewer = get_viewer()
+            token, _ = Token.objects.get_or_create(user=viewer)
+            clients = {False: APIClient(), True: APIClient()}
+            clients[True].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            for name, authenticated, method, urls, payload in (
+                self.get_scenarios(viewer)
+            ):
+                if options['scenario'] and name not in options['scenario']:
+                    continue
+                results['scenarios'][name] = self.run_scenario(
+                    clients[authenticated], method, urls, payload, options
+                )
+            transaction.set_rollback(True)
+
+        self.report(results, baseline)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,289 @@
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from itertools import cycle
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe
+from .benchmark_api import get_viewer
+
+HOST = '127.0.0.1'
+SERVERS = {
+    'wsgi': ['foodgram.wsgi'],
+    'asgi': [
+        '--worker-class', 'uvicorn.workers.UvicornWorker',
+        'foodgram.asgi:application',
+    ],
+}
+
+
+def run_clients(port, scenario, clients, duration):
+    """Нагружает сервер клиентами, каждый из которых ждёт свой ответ.
+
+    Возвращает задержки успешных запросов и число ошибок.
+    """
+    _, authorization, urls = scenario
+    headers = {'Authorization': authorization} if authorization else {}
+    deadline = time.perf_counter() + duration
+    timings, errors = [], []
+
+    def client(offset):
+        connection = http.client.HTTPConnection(HOST, port, timeout=60)
+        paths = cycle(urls[offset % len(urls):] + urls[:offset % len(urls)])
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', next(paths), headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                failed += 1
+                continue
+            if response.status != 200:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        connection.close()
+        timings.extend(local)
+        errors.append(failed)
+
+    threads = [
+        threading.Thread(target=client, args=(index,))
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, sum(errors)
+
+
+def summarize(timings, errors, duration):
+    """Возвращает пропускную способность и задержки в мс."""
+    timings = sorted(timing * 1000 for timing in timings) or [0]
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput_rps': round(len(timings) / duration, 1),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность синхронного развёртывания '
+        '(gunicorn, WSGI) и асинхронного (gunicorn с воркером uvicorn, '
+        'ASGI и ASYNC_READ_VIEWS) при одновременных клиентах. Серверы '
+        'запускаются на локальном порту с текущими настройками и базой, '
+        'данные нужны заранее, например из generate_fake_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            nargs='+',
+            default=[1, 8, 32],
+            help='Числа одновременных клиентов.'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Длительность замера в секундах.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=1,
+            help='Длительность прогрева сценария в секундах.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Количество процессов gunicorn в обоих режимах.'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8765,
+            help='Порт, на котором запускаются серверы.'
+        )
+        parser.add_argument(
+            '--server',
+            nargs='+',
+            choices=tuple(SERVERS),
+            default=list(SERVERS),
+            help='Замеряемые режимы.'
+        )
+        parser.add_argument(
+            '--scenario',
+            nargs='+',
+            help='Запустить только перечисленные сценарии.'
+        )
+        parser.add_argument(
+            '--json',
+            help='Сохранить результаты в файл JSON.'
+        )
+
+    def get_scenarios(self, token):
+        """Описывает сценарии: имя, заголовок Authorization и адреса."""
+        authorization = f'Token {token.key}'
+        recipe_ids = list(
+            Recipe.objects.order_by('-favorites_count', 'id').values_list(
+                'id', flat=True
+            )[:100]
+        )
+        if not recipe_ids:
+            raise CommandError('Нет рецептов, выполните generate_fake_data.')
+        words = {
+            name.split()[0][:3].lower()
+            for name in Ingredient.objects.values_list('name', flat=True)[:50]
+        }
+        return [
+            ('recipe-list-anon', None, ['/api/recipes/']),
+            ('recipe-list', authorization, ['/api/recipes/']),
+            ('recipe-list-pages', authorization, [
+                f'/api/recipes/?page={page}' for page in range(1, 51)
+            ]),
+            ('recipe-detail', authorization, [
+                f'/api/recipes/{pk}/' for pk in recipe_ids
+            ]),
+            ('ingredient-search', None, [
+                f'/api/ingredients/?name={quote(word)}'
+                for word in sorted(words)
+            ]),
+            ('tag-list', None, ['/api/tags/']),
+        ]
+
+    @contextmanager
+    def serve(self, server, port, workers):
+        """Запускает gunicorn в нужном режиме и ждёт готовности."""
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'DJANGO_ALLOWED_HOSTS': '{} {}'.format(
+                os.getenv('DJANGO_ALLOWED_HOSTS', ''), HOST
+            ),
+            'ASYNC_READ_VIEWS': str(server == 'asgi'),
+        }
+        with tempfile.TemporaryFile() as log:
+            process = subprocess.Popen(
+                [
+                    sys.executable, '-m', 'gunicorn',
+                    '--bind', f'{HOST}:{port}',
+                    '--workers', str(workers),
+                    *SERVERS[server],
+                ],
+                cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL, stderr=log,
+            )
+            try:
+                self.wait_ready(process, port, log)
+                yield
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    def wait_ready(self, process, port, log, timeout=30):
+        """Ждёт, пока сервер начнёт отвечать на запросы."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                raise CommandError(
+                    'Сервер завершился:\n' + log.read()[-2000:].decode()
+                )
+            try:
+                connection = http.client.HTTPConnection(HOST, port, timeout=5)
+                connection.request('GET', '/api/tags/')
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f'Сервер не ответил за {timeout} с.')
+
+    def report(self, results, servers):
+        """Выводит таблицу результатов по сценариям и числу клиентов."""
+        header = f'{"сценарий":<20} {"клиенты":>7}'
+        for server in servers:
+            header += (
+                f' {server + " зап/с":>12} {"p50":>7} {"p95":>7} '
+                f'{"ошибки":>6}'
+            )
+        if len(servers) == 2:
+            header += f' {"ускорение":>10}'
+        self.stdout.write(header)
+        for name, rows in results.items():
+            for clients, row in rows.items():
+                line = f'{name:<20} {clients:>7}'
+                for server in servers:
+                    result = row[server]
+                    line += (
+                        f' {result["throughput_rps"]:>12.1f} '
+                        f'{result["p50_ms"]:>7.1f} {result["p95_ms"]:>7.1f} '
+                        f'{result["errors"]:>6}'
+                    )
+                if len(servers) == 2:
+                    first, second = (
+                        row[server]['throughput_rps'] for server in servers
+                    )
+                    line += f' {second / first if first else 0:>9.2f}x'
+                self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        token, created = Token.objects.get_or_create(user=get_viewer())
+        try:
+            scenarios = [
+                scenario for scenario in self.get_scenarios(token)
+                if not options['scenario']
+                or scenario[0] in options['scenario']
+            ]
+            results = {name: {} for name, _, _ in scenarios}
+            for server in options['server']:
+                with self.serve(server, options['port'], options['workers']):
+                    for scenario in scenarios:
+                        name = scenario[0]
+                        self.stderr.write(f'{server}: {name}')
+                        run_clients(
+                            options['port'], scenario,
+                            max(options['clients']), options['warmup']
+                        )
+                        for clients in options['clients']:
+                            timings, errors = run_clients(
+                                options['port'], scenario, clients,
+                                options['duration']
+                            )
+                            results[name].setdefault(clients, {})[server] = (
+                                summarize(timings, errors, options['duration'])
+                            )
+        finally:
+            if created:
+                token.delete()
+
+        self.report(results, options['server'])
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'settings': {
+                        name: options[name]
+                        for name in ('workers', 'duration', 'clients')
+                    },
+                    'scenarios': results,
+                }, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,147 @@
+import base64
+import io
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe
+from .benchmark_pagination import measure
+from .benchmark_serialization import HOST, create_recipes, get_request
+
+
+def paginated(results):
+    """Оборачивает рецепты так же, как пагинатор списка рецептов."""
+    return {
+        'count': len(results),
+        'next': f'http://{HOST}/api/recipes/?page=2',
+        'previous': None,
+        'results': results,
+    }
+
+
+def typed_payload():
+    """Данные с датами, Decimal и ленивыми строками verbose_name."""
+    return {
+        'verbose_name': Recipe._meta.verbose_name,
+        'fields': [field.verbose_name for field in Recipe._meta.fields],
+        'naive': datetime(2023, 7, 1, 12, 30, 15, 123456),
+        'aware': timezone.now(),
+        'date': timezone.now().date(),
+        'amount': Decimal('12.50'),
+        'separators': 'a\u2028b\u2029c',
+        1: 'non-string key',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стандартные JSONRenderer и JSONParser с реализацией '
+        'на orjson на выдаче RecipeReadSerializer. Все изменения '
+        'откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--total',
+            type=int,
+            default=1000,
+            help='Количество рецептов в самой большой выдаче.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов каждого замера.'
+        )
+
+    def get_payloads(self, total):
+        """Сериализует страницы рецептов разного размера."""
+        viewer, ids = create_recipes(total, 8)
+        recipes = list(
+            Recipe.objects.filter(pk__in=ids).prefetch_related(
+                'amount_ingredients__ingredient'
+            ).with_tag_ids().with_user_flags(viewer)
+        )
+        with override_settings(ALLOWED_HOSTS=[HOST]):
+            data = RecipeReadSerializer(
+                recipes, many=True, context={'request': get_request(viewer)}
+            ).data
+        return {
+            f'{size} рецептов': paginated(data[:size])
+            for size in sorted({6, min(100, total), total})
+        }
+
+    def compare(self, name, data):
+        """Проверяет, что оба рендерера дают одинаковый JSON."""
+        expected = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != expected:
+            raise CommandError(f'{name}: JSON отличается от JSONRenderer.')
+        return expected
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError(
+                'orjson не установлен, FastJSONRenderer использует json.'
+            )
+        repeat = options['repeat']
+        self.compare('даты, Decimal, ленивые строки', typed_payload())
+        with transaction.atomic():
+            payloads = self.get_payloads(options['total'])
+            transaction.set_rollback(True)
+        image = base64.b64encode(bytes(range(256)) * 4096).decode()
+        uploads = {
+            'создание рецепта': JSONRenderer().render({
+                'ingredients': [
+                    {'id': index, 'amount': 10} for index in range(20)
+                ],
+                'tags': [1, 2],
+                'image': f'data:image/png;base64,{image}',
+                'name': 'Пирог',
+                'text': 'Описание ' * 100,
+                'cooking_time': 30,
+            }),
+        }
+
+        rows = []
+        for name, data in payloads.items():
+            content = self.compare(name, data)
+            rows.append((
+                'render', name, len(content),
+                *(
+                    measure(lambda: renderer.render(data), repeat)
+                    for renderer in (JSONRenderer(), FastJSONRenderer())
+                )
+            ))
+            uploads[name] = content
+        for name, content in uploads.items():
+            rows.append((
+                'parse', name, len(content),
+                *(
+                    measure(
+                        lambda: parser.parse(io.BytesIO(content)), repeat
+                    )
+                    for parser in (JSONParser(), FastJSONParser())
+                )
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            'JSON FastJSONRenderer совпадает с JSONRenderer.'
+        ))
+        self.stdout.write(
+            f'{"":>6} {"данные":>17} {"КБ":>7} {"json, мс":>9} '
+            f'{"orjson, мс":>11} {"ускорение":>10}'
+        )
+        for action, name, size, standard, fast in rows:
+            self.stdout.write(
+                f'{action:>6} {name:>17} {size / 1024:>7.1f} '
+                f'{standard:>9.3f} {fast:>11.3f} {standard / fast:>9.1f}x'
+            )
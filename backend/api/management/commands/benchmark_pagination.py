@@ -0,0 +1,108 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.pagination import KeysetPagination, RecipePagination
+from recipes.models import Recipe
+from users.models import User
+
+
+def measure(function, repeat):
+    """Возвращает медианное время выполнения функции в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время выдачи первой и глубокой страницы рецептов '
+        'при нумерации страниц (COUNT + OFFSET) и в режиме курсора.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page',
+            type=int,
+            default=10000,
+            help='Номер глубокой страницы.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.'
+        )
+
+    def create_recipes(self, total):
+        """Дополняет таблицу рецептов синтетическими записями."""
+        author, _ = User.objects.get_or_create(
+            username='benchmark',
+            defaults={
+                'email': 'benchmark@example.com',
+                'first_name': 'Benchmark',
+                'last_name': 'Benchmark',
+            }
+        )
+        missing = total - Recipe.objects.count()
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f'Benchmark {index}',
+                    text='Benchmark',
+                    cooking_time=10,
+                    image='recipes/images/benchmark.png',
+                )
+                for index in range(max(missing, 0))
+            ),
+            batch_size=5000
+        )
+
+    def handle(self, *args, **options):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        page, repeat = options['page'], options['repeat']
+        offset = (page - 1) * page_size
+
+        with transaction.atomic():
+            self.create_recipes(page * page_size)
+            queryset = Recipe.objects.order_by(
+                *RecipePagination.keyset_ordering
+            )
+            keyset = KeysetPagination(RecipePagination.keyset_ordering)
+            keyset.fields = keyset.get_fields(Recipe)
+            boundary = list(queryset.values_list(
+                *(field.name for field, _ in keyset.fields)
+            )[offset - 1]) if offset else None
+
+            def page_number(offset):
+                return lambda: (
+                    queryset.count(),
+                    list(queryset[offset:offset + page_size])
+                )
+
+            def cursor(values):
+                if values is None:
+                    return lambda: list(queryset[:page_size + 1])
+                position = keyset.get_position_filter(values, forward=True)
+                return lambda: list(
+                    queryset.filter(position)[:page_size + 1]
+                )
+
+            rows = [
+                ('page-number', 1, measure(page_number(0), repeat)),
+                ('page-number', page, measure(page_number(offset), repeat)),
+                ('cursor', 1, measure(cursor(None), repeat)),
+                ('cursor', page, measure(cursor(boundary), repeat)),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"режим":>12} {"страница":>9} {"мс":>9}')
+        for mode, number, elapsed in rows:
+            self.stdout.write(f'{mode:>12} {number:>9} {elapsed:>9.2f}')
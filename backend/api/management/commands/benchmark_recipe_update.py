@@ -0,0 +1,149 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.serializers import RecipeWriteSerializer
+from recipes.models import Ingredient, IngredientRecipes, Recipe, Tag
+from users.models import User
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    """Считает строки, затронутые изменяющими запросами."""
+
+    def __init__(self):
+        self.rows = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        statement = sql.lstrip().split(' ', 1)[0].upper()
+        if statement in WRITE_STATEMENTS:
+            self.rows[statement] += max(context['cursor'].rowcount, 0)
+        return result
+
+
+def legacy_update(recipe, tags, ingredients):
+    """Прежняя схема обновления: очистка и повторная вставка связей."""
+    recipe.tags.clear()
+    recipe.tags.set(tags)
+    recipe.ingredients.clear()
+    recipe.save()
+    IngredientRecipes.objects.bulk_create([
+        IngredientRecipes(
+            recipe=recipe,
+            ingredient_id=ingredient['id'],
+            amount=ingredient['amount']
+        ) for ingredient in ingredients
+    ])
+    recipe.save()
+
+
+def diff_update(recipe, tags, ingredients):
+    """Текущая схема обновления через RecipeWriteSerializer."""
+    RecipeWriteSerializer().update(recipe, {
+        'tags': tags,
+        'ingredients': ingredients,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    })
+
+
+STRATEGIES = {
+    'legacy': legacy_update,
+    'diff': diff_update,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём записи при редактировании рецепта: '
+        'очистка и вставка против обновления по разнице.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[20, 35, 50],
+            help='Количество ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--changed',
+            type=int,
+            default=1,
+            help='Сколько количеств ингредиентов меняется при правке.'
+        )
+
+    def make_recipe(self, size):
+        """Создаёт рецепт с заданным числом ингредиентов."""
+        ingredients = list(Ingredient.objects.all()[:size])
+        if len(ingredients) < size:
+            raise CommandError(
+                'Недостаточно ингредиентов, выполните load_data'
+            )
+        author, _ = User.objects.get_or_create(
+            username='benchmark',
+            defaults={
+                'email': 'benchmark@example.com',
+                'first_name': 'Benchmark',
+                'last_name': 'Benchmark',
+            }
+        )
+        tag, _ = Tag.objects.get_or_create(
+            slug='benchmark',
+            defaults={'name': 'Benchmark', 'color': '#000001'}
+        )
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Benchmark',
+            text='Benchmark',
+            cooking_time=10,
+            image='recipes/images/benchmark.png',
+        )
+        recipe.tags.set([tag])
+        IngredientRecipes.objects.bulk_create([
+            IngredientRecipes(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        ])
+        return recipe, [tag], ingredients
+
+    def run_strategy(self, strategy, size, changed):
+        """Замеряет одно редактирование рецепта и откатывает изменения."""
+        with transaction.atomic():
+            recipe, tags, ingredients = self.make_recipe(size)
+            payload = [
+                {
+                    'id': ingredient.id,
+                    'amount': 2 if index < changed else 1,
+                }
+                for index, ingredient in enumerate(ingredients)
+            ]
+            counter = WriteCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                STRATEGIES[strategy](recipe, tags, payload)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return counter, elapsed
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"ингр.":>6} {"схема":>7} {"INSERT":>7} {"UPDATE":>7} '
+            f'{"DELETE":>7} {"строк":>6} {"мс":>8}'
+        )
+        for size in options['sizes']:
+            for strategy in STRATEGIES:
+                counter, elapsed = self.run_strategy(
+                    strategy, size, options['changed']
+                )
+                rows = counter.rows
+                self.stdout.write(
+                    f'{size:>6} {strategy:>7} {rows["INSERT"]:>7} '
+                    f'{rows["UPDATE"]:>7} {rows["DELETE"]:>7} '
+                    f'{sum(rows.values()):>6} {elapsed * 1000:>8.2f}'
+                )
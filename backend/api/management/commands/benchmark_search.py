@@ -0,0 +1,170 @@
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.models import Ingredient, IngredientRecipes, Recipe
+from users.models import User
+
+from .benchmark_pagination import measure
+
+WORDS = (
+    'курица', 'говядина', 'свинина', 'рыба', 'картофель', 'морковь',
+    'лук', 'чеснок', 'томат', 'огурец', 'капуста', 'свёкла', 'рис',
+    'гречка', 'макароны', 'сыр', 'сливки', 'молоко', 'яйцо', 'мука',
+    'сахар', 'соль', 'перец', 'масло', 'зелень', 'укроп', 'петрушка',
+    'грибы', 'тыква', 'кабачок', 'баклажан', 'фасоль', 'горох', 'яблоко',
+    'груша', 'вишня', 'малина', 'клубника', 'лимон', 'мёд', 'орехи',
+    'шоколад', 'творог', 'сметана', 'кефир', 'тесто', 'суп', 'салат',
+    'пирог', 'запеканка', 'жарить', 'варить', 'тушить', 'запекать',
+    'нарезать', 'смешать', 'остудить', 'подавать', 'горячий', 'острый',
+)
+RARE_WORD = 'кулебяка'
+QUERIES = (
+    WORDS[0],
+    WORDS[len(WORDS) // 2],
+    WORDS[-1],
+    f'{WORDS[1]} {WORDS[4]}',
+    f'"{WORDS[46]} {WORDS[0]}"',
+    RARE_WORD,
+)
+
+
+def analyze(*models):
+    """Обновляет статистику планировщика для таблиц моделей."""
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время полнотекстового поиска рецептов на синтетических '
+        'данных. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--total',
+            type=int,
+            default=1_000_000,
+            help='Количество рецептов в таблице на время замера.'
+        )
+        parser.add_argument(
+            '--rare',
+            type=int,
+            default=50,
+            help='Количество рецептов с редким словом.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Количество рецептов в одной пачке bulk_create.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=settings.RECIPE_SEARCH_LIMIT or 1000,
+            help=(
+                'Сколько самых новых совпадений ранжировать во втором '
+                'замере (RECIPE_SEARCH_LIMIT).'
+            )
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.'
+        )
+
+    def create_recipes(self, total, rare, batch_size):
+        """Дополняет таблицу рецептов синтетическими записями.
+
+        Слова в названиях и описаниях распределены по закону Ципфа,
+        поэтому в наборе запросов есть частые и редкие слова.
+        """
+        author, _ = User.objects.get_or_create(
+            username='benchmark',
+            defaults={
+                'email': 'benchmark@example.com',
+                'first_name': 'Benchmark',
+                'last_name': 'Benchmark',
+            }
+        )
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:1000]
+        )
+        if len(ingredients) < 3:
+            ingredients = [
+                ingredient.id for ingredient in Ingredient.objects.bulk_create(
+                    Ingredient(name=word, measurement_unit='г')
+                    for word in WORDS
+                )
+            ]
+        generator = random.Random(0)
+        weights = [1 / rank for rank in range(1, len(WORDS) + 1)]
+        missing = max(total - Recipe.objects.count(), 0)
+        for start in range(0, missing, batch_size):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=' '.join(
+                        generator.choices(WORDS, weights, k=3)
+                        + ([RARE_WORD] if index < rare else [])
+                    ),
+                    text=' '.join(generator.choices(WORDS, weights, k=30)),
+                    cooking_time=10,
+                    image='recipes/images/benchmark.png',
+                )
+                for index in range(start, min(start + batch_size, missing))
+            )
+            IngredientRecipes.objects.bulk_create(
+                IngredientRecipes(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=1
+                )
+                for recipe in recipes
+                for ingredient_id in generator.sample(ingredients, 3)
+            )
+        analyze(Recipe, IngredientRecipes)
+        Recipe.objects.filter(
+            search_vector__isnull=True
+        ).update_search_index()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT gin_clean_pending_list('recipe_search_vector_idx')"
+            )
+        analyze(Recipe)
+
+    def handle(self, *args, **options):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        with transaction.atomic():
+            self.create_recipes(
+                options['total'], options['rare'], options['batch_size']
+            )
+            total = Recipe.objects.count()
+            rows = []
+            for query in QUERIES:
+                timings = []
+                for limit in (None, options['limit']):
+                    queryset = Recipe.objects.search(query, limit)
+                    timings.append(measure(
+                        lambda: (
+                            queryset.count(), list(queryset[:page_size])
+                        ),
+                        options['repeat']
+                    ))
+                rows.append((query, Recipe.objects.search(query).count(),
+                             *timings))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Рецептов: {total}')
+        self.stdout.write(
+            f'{"запрос":>24} {"найдено":>9} {"все, мс":>9} '
+            f'{"limit, мс":>10}'
+        )
+        for query, found, full, limited in rows:
+            self.stdout.write(
+                f'{query:>24} {found:>9} {full:>9.2f} {limited:>10.2f}'
+            )
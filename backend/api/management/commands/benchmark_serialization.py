@@ -0,0 +1,158 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from api.serializers import RecipeReadSerializer
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipes, Recipe, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+from .benchmark_pagination import measure
+
+HOST = 'testserver'
+NAMES = (
+    'Борщ', 'Пирог "Домашний"', 'Salad <Niçoise> & co', 'Суп\\лапша',
+)
+
+
+def serialize(recipes, request, fast):
+    """Сериализует рецепты одним из двух способов."""
+    with override_settings(
+        RECIPE_FAST_SERIALIZATION=fast, ALLOWED_HOSTS=[HOST]
+    ):
+        return RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+
+
+def create_recipes(total, size):
+    """Создаёт рецепты разных авторов с тегами и ингредиентами."""
+    viewer = User.objects.create(
+        username='benchmark-viewer', email='viewer@example.com'
+    )
+    authors = User.objects.bulk_create(
+        User(
+            username=f'benchmark-{index}',
+            email=f'benchmark-{index}@example.com',
+            first_name='Автор',
+            last_name='' if index % 2 else f'№{index}',
+        )
+        for index in range(10)
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=viewer, author=author)
+        for author in authors[::2]
+    )
+    tags = [
+        Tag.objects.create(
+            name=f'Benchmark {index}',
+            color=f'#00000{index}',
+            slug=f'benchmark-{index}'
+        )
+        for index in range(3)
+    ]
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+        for index in range(size)
+    )
+    renditions = {
+        name: {
+            image_format: f'recipes/renditions/xx/digest_{name}.'
+                          f'{image_format}'
+            for image_format in ('webp', 'avif')
+        }
+        for name in ('detail', 'card', 'thumbnail')
+    }
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=authors[index % len(authors)],
+            name=NAMES[index % len(NAMES)],
+            text='Benchmark',
+            cooking_time=index % 120 + 1,
+            image=(
+                f'recipes/images/xx/benchmark {index}.png' if index % 4
+                else f'recipes/images/{index % 256:02x}/{index:064x}.png'
+            ),
+            renditions=renditions if index % 3 else {},
+        )
+        for index in range(total)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for index, recipe in enumerate(recipes)
+        for tag in tags[:index % len(tags) + 1]
+    )
+    IngredientRecipes.objects.bulk_create(
+        IngredientRecipes(
+            recipe=recipe, ingredient=ingredient, amount=index + 1
+        )
+        for recipe in recipes
+        for index, ingredient in enumerate(ingredients)
+    )
+    Favorite.objects.bulk_create(
+        Favorite(user=viewer, recipe=recipe) for recipe in recipes[::3]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=viewer, recipe=recipe)
+        for recipe in recipes[::5]
+    )
+    return viewer, [recipe.id for recipe in recipes]
+
+
+def get_request(user):
+    """Создаёт запрос списка рецептов от имени пользователя."""
+    request = RequestFactory().get('/api/recipes/', SERVER_NAME=HOST)
+    request.user = user
+    return request
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость быстрой сериализации рецептов и полей '
+        'RecipeReadSerializer. Совпадение их JSON проверяют тесты api. '
+        'Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--total',
+            type=int,
+            default=1000,
+            help='Количество рецептов в замере.'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=8,
+            help='Количество ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.'
+        )
+
+    def handle(self, *args, **options):
+        total, repeat = options['total'], options['repeat']
+        with transaction.atomic():
+            viewer, ids = create_recipes(total, options['ingredients'])
+            recipes = Recipe.objects.filter(pk__in=ids).prefetch_related(
+                'amount_ingredients__ingredient'
+            ).with_tag_ids()
+            request = get_request(viewer)
+            page = list(recipes.with_user_flags(viewer))
+            timings = {
+                fast: measure(
+                    lambda: serialize(page, request, fast), repeat
+                ) * 1000 / total
+                for fast in (False, True)
+            }
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"способ":>8} {"мкс на рецепт":>14}')
+        self.stdout.write(f'{"DRF":>8} {timings[False]:>14.1f}')
+        self.stdout.write(f'{"быстрый":>8} {timings[True]:>14.1f}')
+        self.stdout.write(
+            f'Ускорение: {timings[False] / timings[True]:.1f}x'
+        )
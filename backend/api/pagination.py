@@ -0,0 +1,195 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .asynchronous import gather, run
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу сортировки без COUNT и OFFSET.
+
+    Курсор хранит значения полей ordering у граничной записи страницы,
+    следующая страница выбирается условием по этим полям, поэтому время
+    ответа не зависит от глубины прокрутки.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering, page_size=None):
+        self.ordering = ordering
+        self.page_size = page_size or settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def get_fields(self, model):
+        """Возвращает поля сортировки и признак убывания для каждого."""
+        return [
+            (model._meta.get_field(name.lstrip('-')), name.startswith('-'))
+            for name in self.ordering
+        ]
+
+    def encode_cursor(self, direction, obj):
+        """Кодирует позицию объекта в строку курсора."""
+        values = [field.value_to_string(obj) for field, _ in self.fields]
+        data = json.dumps({'d': direction, 'v': values}).encode()
+        cursor = base64.urlsafe_b64encode(data).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   cursor)
+
+    def decode_cursor(self, request):
+        """Возвращает направление и значения полей из курсора."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return 'n', None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            direction, values = data['d'], data['v']
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise ValueError
+            values = [
+                field.to_python(value)
+                for (field, _), value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return direction, values
+
+    def get_position_filter(self, values, forward):
+        """Строит условие «после позиции» для лексикографического порядка.
+
+        Нестрогое условие по первому полю позволяет базе начать просмотр
+        составного индекса сразу с нужной позиции.
+        """
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{field.name}__{lookup}': value})
+            equal[field.name] = value
+        (first, descending), value = self.fields[0], values[0]
+        lookup = 'lte' if descending == forward else 'gte'
+        return Q(**{f'{first.name}__{lookup}': value}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.fields = self.get_fields(queryset.model)
+        direction, values = self.decode_cursor(request)
+        forward = direction == 'n'
+
+        ordering = self.ordering if forward else [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(values, forward)
+            )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        if not results:
+            has_next = has_previous = False
+
+        self.next_link = (
+            self.encode_cursor('n', results[-1]) if has_next else None
+        )
+        self.previous_link = (
+            self.encode_cursor('p', results[0]) if has_previous else None
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data),
+        ]))
+
+
+class HybridPagination(PageNumberPagination):
+    """Нумерация страниц с включаемым режимом курсора.
+
+    Режим курсора включается параметром pagination=cursor и действует,
+    пока в запросе передаётся cursor. Если к выборке применена другая
+    сортировка, используется обычная нумерация страниц.
+    """
+    keyset_ordering = ('-id',)
+    mode_query_param = 'pagination'
+    keyset = None
+
+    def use_keyset(self, queryset, request):
+        """Проверяет, запрошен ли и применим ли режим курсора."""
+        requested = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+        return requested and not queryset.query.order_by
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(queryset, request):
+            self.keyset = KeysetPagination(self.keyset_ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    async def async_paginate_queryset(self, queryset, request, view=None):
+        """Асинхронный paginate_queryset с одновременными COUNT и выборкой.
+
+        Одновременно выбирается только страница с известным номером,
+        курсор и page=last обрабатываются синхронным кодом в потоке.
+        """
+        page_size = self.get_page_size(request)
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            number = 0
+        if not page_size or number < 1 or self.use_keyset(queryset, request):
+            return await run(self.paginate_queryset, queryset, request, view)
+        self.keyset = None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        bottom = (number - 1) * page_size
+        paginator.count, objects = await gather(
+            (queryset.count,),
+            (list, queryset[bottom:bottom + page_size]),
+        )
+        try:
+            self.page = Page(
+                objects, paginator.validate_number(number), paginator
+            )
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=number, message=str(exc)
+            ))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return objects
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(HybridPagination):
+    """Пагинация рецептов."""
+    keyset_ordering = ('-pub_date', '-id')
+
+
+class SubscriptionPagination(HybridPagination):
+    """Пагинация подписок."""
+    keyset_ordering = ('username', 'id')
@@ -0,0 +1,55 @@
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.metrics import track_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON через orjson с откатом на стандартный json.
+
+    Даты, Decimal и ленивые строки orjson передаёт кодировщику DRF,
+    поэтому их представление не меняется. Отступы, ensure_ascii и
+    значения, которые orjson не умеет кодировать (например, целые вне
+    64 бит), обрабатывает JSONRenderer. NaN и бесконечности orjson
+    записывает как null, а не отвечает ошибкой.
+    """
+    options = 0 if orjson is None else (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track_serialization():
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b''
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            result = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in result:
+                result = result.replace(separator, escaped)
+        return result
@@ -1,19 +1,41 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils.functional import cached_property
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 from rest_framework.validators import UniqueTogetherValidator
 
+from foodgram.db.replicas import pin_primary
+from foodgram.metrics import track_serialization
 from recipes.models import (
     Favorite, Ingredient, IngredientRecipes,
     Recipe, ShoppingCart, Tag
 )
+from recipes.images import schedule_renditions
+from recipes.tags import tag_registry
 from users.models import Subscription
 
+from .fields import (
+    MediaUrls, RenditionsField, StreamingBase64ImageField
+)
+from .utils import get_recipes_limit
+
 User = get_user_model()
 
 
+class TrackedSerializerMixin:
+    """Учитывает построение данных в метрике сериализации запроса."""
+
+    def to_representation(self, instance):
+        with track_serialization():
+            return super().to_representation(instance)
+
+
 class BaseSerializer(serializers.ModelSerializer):
     """Базовый сериализатор."""
 
@@ -25,7 +47,7 @@ class BaseSerializer(serializers.ModelSerializer):
         )
 
 
-class UserSerializer(UserSerializer):
+class UserSerializer(TrackedSerializerMixin, UserSerializer):
     """Сериализатор пользователя."""
     is_subscribed = SerializerMethodField()
 
@@ -42,6 +64,9 @@ class UserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """Получает queryset с рецептами из избранного."""
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context.get('request').user
         return user.is_authenticated and Subscription.objects.filter(
             user=user,
@@ -49,7 +74,9 @@ class UserSerializer(UserSerializer):
         ).exists()
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TrackedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор ингредиентов."""
     id = serializers.PrimaryKeyRelatedField(read_only=True)
 
@@ -92,7 +119,7 @@ class IngredientRecipeWriteSerializer(serializers.ModelSerializer):
         )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TrackedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор тега."""
     id = serializers.PrimaryKeyRelatedField(read_only=True)
 
@@ -106,11 +133,64 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+def get_tags_data(tags):
+    """Возвращает данные тегов из реестра, сериализуя каждый тег один раз."""
+    result = []
+    for tag in tags:
+        data = getattr(tag, 'serialized', None)
+        if data is None:
+            data = tag.serialized = TagSerializer(tag).data
+        result.append(data)
+    return result
+
+
+def get_tag_ids(recipe):
+    """Возвращает идентификаторы тегов рецепта.
+
+    Идентификаторы берутся из аннотации tag_ids, а без неё из
+    связующей таблицы без соединения с таблицей тегов.
+    """
+    tag_ids = getattr(recipe, 'tag_ids', None)
+    if tag_ids is None:
+        tag_ids = recipe.tags.through.objects.filter(
+            recipe_id=recipe.pk
+        ).values_list('tag_id', flat=True)
+    return tag_ids
+
+
+class RegistryTagsField(serializers.ReadOnlyField):
+    """Теги рецепта из реестра тегов."""
+
+    def get_attribute(self, instance):
+        return get_tag_ids(instance)
+
+    def to_representation(self, tag_ids):
+        return get_tags_data(tag_registry.get_tags(tag_ids))
+
+
+class RegistryTagField(serializers.PrimaryKeyRelatedField):
+    """Тег по идентификатору, который проверяется по реестру тегов."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get_by_id(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+
+class RecipeReadSerializer(
+    TrackedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор чтения рецепта."""
-    tags = TagSerializer(many=True, read_only=True)
+    tags = RegistryTagsField()
     author = UserSerializer(read_only=True)
     image = Base64ImageField(read_only=True)
+    renditions = RenditionsField()
     ingredients = IngredientRecipeReadSerializer(
         many=True, source='amount_ingredients'
     )
@@ -128,6 +208,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'renditions',
             'text',
             'cooking_time',
         )
@@ -137,6 +218,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Получает queryset с рецептами из избранного."""
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -145,21 +229,102 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Получает queryset с рецептами в корзине."""
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context.get('request').user
         return (
             user.is_authenticated and user.cart.filter(recipe=obj).exists()
         )
 
+    def get_author_data(self, author):
+        """Возвращает данные автора в формате UserSerializer."""
+        is_subscribed = getattr(author, 'is_subscribed', None)
+        if is_subscribed is None:
+            is_subscribed = UserSerializer(
+                context=self.context
+            ).get_is_subscribed(author)
+        return {
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': is_subscribed,
+        }
+
+    @cached_property
+    def tags_plan(self):
+        """Данные тегов из одного снимка реестра на всю выдачу."""
+        tags = tag_registry.all()
+        return list(zip((tag.id for tag in tags), get_tags_data(tags)))
+
+    @cached_property
+    def image_urls(self):
+        return MediaUrls(
+            Recipe._meta.get_field('image').storage,
+            self.context.get('request')
+        )
+
+    @cached_property
+    def rendition_urls(self):
+        return MediaUrls(default_storage, self.context.get('request'))
+
+    def to_representation(self, instance):
+        """Собирает данные рецепта словарём без обхода полей DRF.
+
+        Результат совпадает с выводом объявленных полей, что проверяют
+        тесты api. При выключенной настройке
+        RECIPE_FAST_SERIALIZATION данные строят поля сериализатора.
+        """
+        if not settings.RECIPE_FAST_SERIALIZATION:
+            return super().to_representation(instance)
+        tag_ids = set(get_tag_ids(instance))
+        renditions = instance.renditions
+        if renditions is not None:
+            renditions = {
+                name: {
+                    image_format: self.rendition_urls(path)
+                    for image_format, path in formats.items()
+                }
+                for name, formats in renditions.items()
+            }
+        return {
+            'id': instance.id,
+            'tags': [
+                data for tag_id, data in self.tags_plan if tag_id in tag_ids
+            ],
+            'author': self.get_author_data(instance.author),
+            'ingredients': [
+                {
+                    'id': amount.ingredient.id,
+                    'name': amount.ingredient.name,
+                    'measurement_unit': amount.ingredient.measurement_unit,
+                    'amount': amount.amount,
+                }
+                for amount in instance.amount_ingredients.all()
+            ],
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+            'name': instance.name,
+            'image': (
+                self.image_urls(instance.image.name) if instance.image
+                else None
+            ),
+            'renditions': renditions,
+            'cooking_time': instance.cooking_time,
+        }
+
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор записи рецепта."""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = RegistryTagField(
         queryset=Tag.objects.all(),
         many=True
     )
     author = UserSerializer(read_only=True)
     ingredients = IngredientRecipeWriteSerializer(many=True)
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -178,6 +343,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self.validate_ingredients_presence(data)
         self.validate_tags_presence(data)
         self.validate_ingredient_weights(data)
+        self.validate_ingredients_exist(data)
         self.validate_unique_tags(data)
 
         if data['cooking_time'] <= 0:
@@ -219,6 +385,17 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Вес ингредиента должен быть больше нуля')
 
+    def validate_ingredients_exist(self, data):
+        """Проверяет существование ингредиентов одним запросом."""
+        ids = {ingredient['id'] for ingredient in data.get('ingredients', [])}
+        missing = ids - set(Ingredient.objects.in_bulk(ids))
+        if missing:
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиенты не найдены: {}'.format(
+                    ', '.join(str(pk) for pk in sorted(missing))
+                )}
+            )
+
     def validate_unique_tags(self, data):
         """Проверяет уникальность тегов."""
         tags = data.get('tags', [])
@@ -227,46 +404,106 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     def create_ingredients(self, ingredients, recipe):
         """Создаёт ингредиенты."""
+        if not ingredients:
+            return
         IngredientRecipes.objects.bulk_create(
             [IngredientRecipes(
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
 
+    def update_ingredients(self, ingredients, recipe):
+        """Применяет к рецепту только изменения в составе ингредиентов."""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            ingredient_recipe.ingredient_id: ingredient_recipe
+            for ingredient_recipe in IngredientRecipes.objects.filter(
+                recipe=recipe
+            )
+        }
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            IngredientRecipes.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, ingredient_recipe in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and ingredient_recipe.amount != amount:
+                ingredient_recipe.amount = amount
+                changed.append(ingredient_recipe)
+        if changed:
+            IngredientRecipes.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(
+            ingredients=[
+                ingredient for ingredient in ingredients
+                if ingredient['id'] not in existing
+            ],
+            recipe=recipe
+        )
+
+    def save(self, **kwargs):
+        """Сохраняет рецепт и удаляет временный файл изображения.
+
+        Чтение автора закрепляется за основной базой, чтобы он сразу
+        увидел изменения.
+        """
+        try:
+            recipe = super().save(**kwargs)
+            pin_primary(self.context['request'])
+            return recipe
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
+        recipe.tag_ids = [tag.id for tag in tags]
         self.create_ingredients(recipe=recipe, ingredients=ingredients)
+        schedule_renditions(recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Обновляет рецепт."""
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
+        image_name = instance.image.name
         super().update(instance, validated_data)
-        self.create_ingredients(
-            recipe=instance,
-            ingredients=ingredients
-        )
-        instance.save()
+        instance.tags.set(tags)
+        instance.tag_ids = [tag.id for tag in tags]
+        self.update_ingredients(recipe=instance, ingredients=ingredients)
+        if instance.image.name != image_name:
+            instance.renditions = {}
+            Recipe.objects.filter(pk=instance.pk).update(renditions={})
+            schedule_renditions(instance.id)
         return instance
 
     def to_representation(self, instance):
         """Получает queryset с рецептами из избранного."""
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects(
+            [instance], 'amount_ingredients__ingredient'
+        )
         return RecipeReadSerializer(instance, context=context).data
 
 
-class RecipeFavoriteSerializer(serializers.ModelSerializer):
+class RecipeFavoriteSerializer(
+    TrackedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор любимых рецептов."""
+    renditions = RenditionsField()
 
     class Meta:
         model = Recipe
@@ -274,6 +511,7 @@ class RecipeFavoriteSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'renditions',
             'cooking_time'
         )
 
@@ -341,12 +579,19 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
 class SubscriptionReadSerializer(UserSerializer):
     """Сериализатор чтения подписки на рецепт."""
-    recipes = RecipeFavoriteSerializer(many=True, read_only=True)
-    recipes_count = SerializerMethodField(read_only=True)
+    recipes = SerializerMethodField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
-    def get_recipes_count(self, obj):
-        """Получает queryset с рецептами из избранного."""
-        return obj.recipes.count()
+    def get_recipes(self, obj):
+        """Получает последние рецепты автора с учётом recipes_limit."""
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return RecipeFavoriteSerializer(
+            recipes, many=True, context=self.context
+        ).data
@@ -0,0 +1,136 @@
+import csv
+import os
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+from recipes.models import IngredientRecipes
+
+SHOPPING_LIST_TITLE = 'Список покупок:'
+
+PDF_FONT_NAME = 'ShoppingList'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 7
+PDF_MARGIN = 18
+
+
+def get_shopping_list(user):
+    """Суммирует ингредиенты из корзины пользователя одним запросом."""
+    return IngredientRecipes.objects.filter(
+        recipe__cart__user=user
+    ).values(
+        'ingredient',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+    )
+
+
+def get_shopping_list_rows(user):
+    """Возвращает строки списка покупок: название, единицы и количество.
+
+    Строк не больше, чем ингредиентов в базе, поэтому список выбирается
+    целиком.
+    """
+    return [
+        (
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['total_amount'],
+        )
+        for row in get_shopping_list(user)
+    ]
+
+
+def format_line(name, measurement_unit, amount):
+    """Возвращает строку списка покупок."""
+    return f'{name} ({measurement_unit}) - {amount}'
+
+
+def render_txt(rows):
+    """Формирует список покупок в текстовом формате."""
+    yield f'{SHOPPING_LIST_TITLE}\n'
+    for row in rows:
+        yield f'{format_line(*row)}\n'
+
+
+class Echo:
+    """Буфер, возвращающий записанное значение вместо его хранения."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    """Формирует список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единицы измерения', 'Количество'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def get_pdf():
+    """Создаёт документ PDF со шрифтом, поддерживающим кириллицу.
+
+    fpdf2 встраивает в документ только использованные символы шрифта.
+    Без шрифта SHOPPING_LIST_PDF_FONT используется Helvetica, в которой
+    нет кириллицы.
+    """
+    pdf = FPDF(format='A4')
+    pdf.set_margins(PDF_MARGIN, PDF_MARGIN)
+    pdf.set_auto_page_break(True, PDF_MARGIN)
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if font_path and os.path.exists(font_path):
+        pdf.add_font(PDF_FONT_NAME, fname=font_path)
+        pdf.set_font(PDF_FONT_NAME, size=PDF_FONT_SIZE)
+    else:
+        pdf.set_font('Helvetica', size=PDF_FONT_SIZE)
+    pdf.add_page()
+    return pdf
+
+
+def render_pdf(rows):
+    """Формирует список покупок в формате PDF."""
+    pdf = get_pdf()
+    unicode_font = pdf.font_family == PDF_FONT_NAME.lower()
+    for line in chain(
+        [SHOPPING_LIST_TITLE], (format_line(*row) for row in rows)
+    ):
+        if not unicode_font:
+            line = line.encode('latin-1', 'replace').decode('latin-1')
+        pdf.multi_cell(
+            0, PDF_LINE_HEIGHT, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT
+        )
+    yield bytes(pdf.output())
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+
+
+def shopping_list_response(user, file_format):
+    """Возвращает потоковый ответ со списком покупок.
+
+    Строки выбираются до возврата ответа: под ASGI Django 3.2 читает
+    потоковый ответ в цикле событий, где запросы к базе запрещены.
+    """
+    renderer, content_type = SHOPPING_LIST_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        renderer(get_shopping_list_rows(user)),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"'
+    )
+    return response
@@ -0,0 +1,947 @@
+import base64
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    AsyncClient, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.http import urlencode
+from PIL import Image
+from rest_framework import routers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipes.autocomplete import ingredient_autocomplete
+from recipes.images import RENDITIONS_DIR
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipes, Recipe, ShoppingCart, Tag
+)
+from recipes.ranking import refresh_scores
+from recipes.storage import ContentAddressedStorage
+from recipes.tags import tag_registry
+from users.models import Subscription, User
+
+from .management.commands.benchmark_serialization import (
+    create_recipes, get_request, serialize
+)
+from .pagination import RecipePagination
+from .shopping_list import SHOPPING_LIST_FORMATS
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+
+class APIDataMixin:
+    """Общие данные тестов API."""
+
+    @classmethod
+    def create_data(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Автор', last_name='Рецептов'
+        )
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            password='password', first_name='Читатель', last_name='Рецептов'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag-{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'солод', 'сахар', 'фасоль', 'мука')
+        )
+
+    def setUp(self):
+        # Реестр тегов и кэш ингредиентов живут в памяти процесса и
+        # не знают об откате транзакций между тестами.
+        tag_registry.version = ingredient_autocomplete.version = None
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+
+    def create_recipes(self, total, author=None):
+        """Создаёт рецепты с двумя тегами и тремя ингредиентами."""
+        recipes = []
+        for number in range(total):
+            recipe = Recipe.objects.create(
+                author=author or self.author, name=f'Рецепт {number}',
+                image='recipes/images/recipe.png', text='Описание',
+                cooking_time=number + 1
+            )
+            recipe.tags.set(self.tags[:2])
+            IngredientRecipes.objects.bulk_create(
+                IngredientRecipes(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in self.ingredients[:3]
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def use_temporary_media(self):
+        """Перенаправляет MEDIA_ROOT во временный каталог до конца теста."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        return media_root
+
+    def get_client(self, user=None):
+        """Клиент анонима или пользователя с токеном, как у фронтенда."""
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+
+class APITestCase(APIDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_data()
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(APITestCase):
+    """Эндпоинты укладываются в query_budgets своих вьюсетов.
+
+    При QUERY_BUDGET_RAISE превышение бюджета выбрасывает
+    QueryBudgetExceeded и роняет тест.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = self.create_recipes(3)
+        Subscription.objects.create(user=self.user, author=self.author)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        self.recipe_url = f'/api/recipes/{self.recipes[1].id}/'
+        self.read_urls = (
+            '/api/recipes/', self.recipe_url, '/api/tags/',
+            '/api/ingredients/?name=сол', '/api/users/',
+        )
+
+    def assert_get(self, client, urls):
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_anonymous_read_endpoints(self):
+        self.assert_get(self.get_client(), self.read_urls)
+
+    def test_user_read_endpoints(self):
+        self.assert_get(self.get_client(self.user), self.read_urls + (
+            f'/api/users/{self.author.id}/', '/api/users/me/',
+            '/api/users/subscriptions/', '/api/recipes/?is_favorited=1',
+            '/api/recipes/download_shopping_cart/',
+        ))
+
+    def test_write_endpoints(self):
+        other = User.objects.create_user(
+            email='other@example.com', username='other',
+            password='password', first_name='Другой', last_name='Автор'
+        )
+        client = self.get_client(self.user)
+        for url in (
+            f'{self.recipe_url}favorite/',
+            f'{self.recipe_url}shopping_cart/',
+            f'/api/users/{other.id}/subscribe/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(client.post(url).status_code, 201)
+                self.assertEqual(client.delete(url).status_code, 204)
+
+
+class RecipeListQueriesTests(APITestCase):
+    """Число SQL-запросов списка рецептов не зависит от размера страницы."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = self.create_recipes(20)
+        Subscription.objects.create(user=self.user, author=self.author)
+        Favorite.objects.create(user=self.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=recipes[1])
+        # Реестр тегов загружается один раз на процесс.
+        tag_registry.all()
+
+    def test_queries_do_not_depend_on_page_size(self):
+        # Аноним: COUNT, рецепты, авторы, ингредиенты рецептов и сами
+        # ингредиенты. Пользователю добавляются токен и запросы его
+        # избранного, корзины и подписок.
+        for user, queries in ((None, 5), (self.user, 9)):
+            client = self.get_client(user)
+            for page_size in (2, 6, 20):
+                with self.subTest(user=user, page_size=page_size):
+                    caches[settings.RESPONSE_CACHE_ALIAS].clear()
+                    with mock.patch.object(
+                        RecipePagination, 'page_size', page_size
+                    ), self.assertNumQueries(queries):
+                        response = client.get('/api/recipes/')
+                    self.assertEqual(
+                        len(response.json()['results']), page_size
+                    )
+
+
+class TagRegistryTests(APITestCase):
+    """Реестр тегов в памяти процесса."""
+
+    def get_slugs(self):
+        return [tag.slug for tag in tag_registry.all()]
+
+    def test_invalidate_waits_for_commit(self):
+        slugs = self.get_slugs()
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Новый', color='#000010', slug='new')
+            self.assertEqual(self.get_slugs(), slugs)
+        self.assertIn('new', self.get_slugs())
+
+
+class RecipeListCacheTests(APITestCase):
+    """Кэш анонимной выдачи списка рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = self.create_recipes(2)
+        tag_registry.all()
+
+    def get_recipe(self, client=None):
+        """Рецепт self.recipes[0] из выдачи списка."""
+        response = (client or self.get_client()).get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return next(
+            recipe for recipe in response.json()['results']
+            if recipe['id'] == self.recipes[0].id
+        )
+
+    def test_change_without_version_bump_is_cached(self):
+        self.get_recipe()
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(name='Новое')
+        self.assertEqual(self.get_recipe()['name'], 'Рецепт 0')
+
+    def test_invalidated_by_version_bump(self):
+        recipe = self.recipes[0]
+        ingredient = self.ingredients[0]
+
+        def rename_recipe():
+            recipe.name = 'Новое название'
+            recipe.save()
+
+        def rename_ingredient():
+            ingredient.name = 'соль морская'
+            ingredient.save()
+
+        for change, check in (
+            (rename_recipe, lambda data: data['name'] == 'Новое название'),
+            (
+                lambda: recipe.tags.set([self.tags[2]]),
+                lambda data: [tag['id'] for tag in data['tags']] == [
+                    self.tags[2].id
+                ]
+            ),
+            (
+                rename_ingredient,
+                lambda data: 'соль морская' in [
+                    item['name'] for item in data['ingredients']
+                ]
+            ),
+        ):
+            with self.subTest(change=change):
+                self.assertFalse(check(self.get_recipe()))
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                self.assertTrue(check(self.get_recipe()))
+
+    def test_user_flags_on_cached_page(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        Subscription.objects.create(user=self.user, author=self.author)
+        anonymous = self.get_client()
+        flags = ('is_favorited', 'is_in_shopping_cart')
+        recipe = self.get_recipe(anonymous)
+        self.assertEqual([recipe[flag] for flag in flags], [False, False])
+        client = self.get_client(self.user)
+        # Из кэша: токен и флаги пользователя без выборки рецептов.
+        with self.assertNumQueries(4):
+            response = client.get('/api/recipes/')
+        for recipe in response.json()['results']:
+            with self.subTest(recipe=recipe['id']):
+                favorite = recipe['id'] == self.recipes[0].id
+                self.assertEqual(
+                    [recipe[flag] for flag in flags], [favorite, favorite]
+                )
+                self.assertIs(recipe['author']['is_subscribed'], True)
+        recipe = self.get_recipe(anonymous)
+        self.assertEqual([recipe[flag] for flag in flags], [False, False])
+        self.assertIs(recipe['author']['is_subscribed'], False)
+
+
+class RecipeFilterTests(APITestCase):
+    """Фильтры списка рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        salt, malt, sugar, beans, flour = self.ingredients
+        self.recipes = [
+            self.create_recipe(name, ingredients)
+            for name, ingredients in (
+                ('Соленья', (salt, malt)),
+                ('Рагу', (salt, malt, sugar, beans)),
+                ('Лепёшки', (flour,)),
+                ('Пирог', (salt, sugar, beans, flour)),
+            )
+        ]
+        Recipe.objects.update_search_index()
+
+    def create_recipe(self, name, ingredients):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name,
+            image='recipes/images/recipe.png', text='Описание',
+            cooking_time=10
+        )
+        IngredientRecipes.objects.bulk_create(
+            IngredientRecipes(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def get_ids(self, **params):
+        response = self.get_client().get(
+            f'/api/recipes/?{urlencode(params, doseq=True)}'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def get_ingredient_ids(self, *numbers):
+        return ','.join(str(self.ingredients[number].id) for number in numbers)
+
+    def test_ingredients_all(self):
+        pickles, stew, _, _ = self.recipes
+        self.assertCountEqual(
+            self.get_ids(ingredients_all=self.get_ingredient_ids(0, 1)),
+            [pickles.id, stew.id]
+        )
+
+    def test_ingredients_any(self):
+        self.assertCountEqual(
+            self.get_ids(ingredients_any=self.get_ingredient_ids(1, 4)),
+            [recipe.id for recipe in self.recipes]
+        )
+
+    def test_max_missing_orders_closest_first(self):
+        pickles, stew, _, pie = self.recipes
+        ids = self.get_ingredient_ids(0, 1, 2)
+        for max_missing, expected in (
+            (0, [pickles]),
+            (1, [pickles, stew]),
+            (2, [pickles, stew, pie]),
+        ):
+            with self.subTest(max_missing=max_missing):
+                self.assertEqual(
+                    self.get_ids(ingredients_any=ids, max_missing=max_missing),
+                    [recipe.id for recipe in expected]
+                )
+
+    def test_max_missing_ignores_repeated_ids(self):
+        pickles, _, _, _ = self.recipes
+        salt = self.ingredients[0].id
+        self.assertFalse(
+            Recipe.objects.with_ingredients([salt] * 3, max_missing=0)
+        )
+        ids = self.get_ingredient_ids(0, 0, 0)
+        for max_missing, expected in ((0, []), (1, [pickles.id])):
+            with self.subTest(max_missing=max_missing):
+                self.assertEqual(
+                    self.get_ids(ingredients_any=ids, max_missing=max_missing),
+                    expected
+                )
+
+    def test_max_missing_requires_ingredients_any(self):
+        response = self.get_client().get('/api/recipes/?max_missing=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('max_missing', response.data)
+
+    def test_tags_any_and_all(self):
+        pickles, stew, bread, _ = self.recipes
+        first, second, _ = self.tags
+        pickles.tags.set([first])
+        stew.tags.set([first, second])
+        bread.tags.set([second])
+        slugs = [first.slug, second.slug]
+        self.assertCountEqual(
+            self.get_ids(tags=slugs), [pickles.id, stew.id, bread.id]
+        )
+        self.assertEqual(self.get_ids(tags_all=slugs), [stew.id])
+
+    def test_search_russian_word_forms(self):
+        pickles, stew, _, pie = self.recipes
+        for query, expected in (
+            ('пироги', [pie]),
+            ('соленьями', [pickles]),
+            ('с фасолью', [stew, pie]),
+        ):
+            with self.subTest(query=query):
+                self.assertCountEqual(
+                    self.get_ids(search=query),
+                    [recipe.id for recipe in expected]
+                )
+
+    def test_search_index_after_rollback(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    recipe.name = 'Пирожки'
+                    recipe.save()
+                    raise ValueError
+            recipe.name = 'Ватрушки'
+            recipe.save()
+        self.assertEqual(self.get_ids(search='ватрушки'), [recipe.id])
+
+
+class RecipeOrderingTests(APITestCase):
+    """Сортировка рецептов по рейтингу популярности."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = self.create_recipes(4)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipes[2])
+        refresh_scores(full=True)
+
+    def get_ids(self, ordering):
+        response = self.get_client().get(f'/api/recipes/?ordering={ordering}')
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_scored_recipes_first(self):
+        # Рецепты без событий идут следом, новые раньше старых.
+        first, second, third, fourth = self.recipes
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(
+                    self.get_ids(ordering),
+                    [second.id, third.id, fourth.id, first.id]
+                )
+
+    def test_refresh_after_removed_events(self):
+        first, second, third, fourth = self.recipes
+        Favorite.objects.filter(recipe=second).delete()
+        ShoppingCart.objects.filter(recipe=second).delete()
+        refresh_scores()
+        self.assertEqual(
+            self.get_ids('popular'),
+            [third.id, fourth.id, second.id, first.id]
+        )
+
+    def test_new_recipe_before_refresh(self):
+        recipe, = self.create_recipes(1)
+        self.assertEqual(
+            self.get_ids('popular')[:3],
+            [self.recipes[1].id, self.recipes[2].id, recipe.id]
+        )
+
+
+class KeysetPaginationTests(APITestCase):
+    """Режим курсора в списках рецептов и подписок."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = self.create_recipes(14)
+        # Группы по четыре рецепта с одной датой пересекают границы
+        # страниц по шесть рецептов.
+        now = timezone.now()
+        for index, recipe in enumerate(recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(hours=index // 4)
+            )
+        self.expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+
+    def walk(self, client, url, link):
+        """Проходит по ссылкам link.
+
+        Возвращает идентификаторы на страницах и последний ответ.
+        """
+        pages = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            data = response.json()
+            self.assertNotIn('count', data)
+            pages.append([item['id'] for item in data['results']])
+            url = data[link]
+        return pages, data
+
+    def test_forward_and_backward_walk(self):
+        client = self.get_client()
+        pages, last = self.walk(
+            client, '/api/recipes/?pagination=cursor', 'next'
+        )
+        self.assertEqual([len(page) for page in pages], [6, 6, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+        backward, _ = self.walk(client, last['previous'], 'previous')
+        self.assertEqual(sum(reversed(backward), []), self.expected[:12])
+
+    def test_explicit_ordering_uses_page_numbers(self):
+        response = self.get_client().get(
+            '/api/recipes/?pagination=cursor&ordering=popular'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], len(self.expected))
+
+    def test_malformed_cursor(self):
+        for cursor in ('not-a-cursor', 'eyJkIjogIngifQ=='):
+            with self.subTest(cursor=cursor):
+                response = self.get_client().get(
+                    f'/api/recipes/?cursor={cursor}'
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_subscriptions_by_username(self):
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author-{number:02}', password='password',
+                first_name='Автор', last_name=f'Номер {number}'
+            )
+            for number in (5, 1, 7, 3, 0, 6, 2, 4)
+        ]
+        Subscription.objects.bulk_create(
+            Subscription(user=self.user, author=author) for author in authors
+        )
+        pages, _ = self.walk(
+            self.get_client(self.user),
+            '/api/users/subscriptions/?pagination=cursor', 'next'
+        )
+        self.assertEqual([len(page) for page in pages], [6, 2])
+        self.assertEqual(sum(pages, []), [
+            author.id
+            for author in sorted(authors, key=lambda user: user.username)
+        ])
+
+
+class ShoppingListTests(APITestCase):
+    """Список покупок суммирует ингредиенты рецептов корзины."""
+
+    def setUp(self):
+        super().setUp()
+        first, second, other = self.create_recipes(3)
+        ShoppingCart.objects.create(user=self.user, recipe=first)
+        ShoppingCart.objects.create(user=self.user, recipe=second)
+        ShoppingCart.objects.create(user=self.author, recipe=other)
+        IngredientRecipes.objects.create(
+            recipe=second, ingredient=self.ingredients[3], amount=5
+        )
+        self.client = self.get_client(self.user)
+
+    def test_duplicate_ingredients_are_summed(self):
+        # Токен с пользователем и сам список покупок.
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/?file_format=txt'
+            )
+            content = b''.join(response.streaming_content).decode()
+        title, *lines = content.splitlines()
+        self.assertEqual(title, 'Список покупок:')
+        # Порядок строк зависит от правил сортировки базы.
+        self.assertCountEqual(lines, [
+            'сахар (г) - 3',
+            'соль (г) - 3',
+            'солод (г) - 3',
+            'фасоль (г) - 5',
+        ])
+
+
+def get_image_data():
+    """Возвращает PNG-изображение в виде data URI, как его шлёт фронтенд."""
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class RecipeWriteQueriesTests(APITestCase):
+    """Создание и изменение рецепта с ингредиентами.
+
+    Число запросов не зависит от числа ингредиентов, а изменение рецепта
+    затрагивает только изменившиеся строки состава.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_media()
+        self.ingredients = self.ingredients + Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(60)
+        )
+        self.client = self.get_client(self.author)
+        tag_registry.all()
+
+    def get_data(self, total):
+        return {
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': number + 1}
+                for number, ingredient in enumerate(
+                    self.ingredients[:total]
+                )
+            ],
+            'name': f'Рецепт из {total} ингредиентов',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': get_image_data(),
+        }
+
+    def count_queries(self, method, url, data, status_code):
+        with CaptureQueriesContext(connection) as context:
+            response = method(url, data, format='json')
+        self.assertEqual(response.status_code, status_code, response.data)
+        return response, len(context.captured_queries)
+
+    def test_queries_do_not_depend_on_ingredients(self):
+        created, updated = [], []
+        for total in (2, 30):
+            response, queries = self.count_queries(
+                self.client.post, '/api/recipes/', self.get_data(total), 201
+            )
+            created.append(queries)
+            url = f'/api/recipes/{response.data["id"]}/'
+            # Изменение заменяет все ингредиенты рецепта другими.
+            data = self.get_data(total)
+            data['ingredients'] = [
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in self.ingredients[-total:]
+            ]
+            _, queries = self.count_queries(
+                self.client.patch, url, data, 200
+            )
+            updated.append(queries)
+            self.assertEqual(
+                Recipe.objects.get(pk=response.data['id'])
+                .amount_ingredients.count(),
+                total
+            )
+        self.assertEqual(created[0], created[1])
+        self.assertEqual(updated[0], updated[1])
+
+    def test_update_changes_only_affected_rows(self):
+        response = self.client.post(
+            '/api/recipes/', self.get_data(4), format='json'
+        )
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        before = {
+            row.ingredient_id: row for row in recipe.amount_ingredients.all()
+        }
+        kept, changed, removed, unchanged = self.ingredients[:4]
+        added = self.ingredients[4]
+        data = self.get_data(4)
+        data['ingredients'] = [
+            {'id': kept.id, 'amount': 1},
+            {'id': changed.id, 'amount': 20},
+            {'id': unchanged.id, 'amount': 4},
+            {'id': added.id, 'amount': 5},
+        ]
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', data, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        after = {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in recipe.amount_ingredients.all()
+        }
+        self.assertEqual(after.pop(added.id)[1], 5)
+        self.assertEqual(after, {
+            kept.id: (before[kept.id].pk, 1),
+            changed.id: (before[changed.id].pk, 20),
+            unchanged.id: (before[unchanged.id].pk, 4),
+        })
+        self.assertFalse(IngredientRecipes.objects.filter(
+            pk=before[removed.id].pk
+        ).exists())
+
+    def test_unknown_ingredient(self):
+        data = self.get_data(2)
+        data['ingredients'].append({'id': 10 ** 6, 'amount': 1})
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+
+
+class MediaStorageTests(APITestCase):
+    """Хранение изображений по содержимому и очистка неиспользуемых."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = self.use_temporary_media()
+        self.storage = ContentAddressedStorage()
+
+    def list_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def age(self, storage, name):
+        """Делает файл старше порога gc_media."""
+        modified = time.time() - 2 * 60 * 60
+        os.utime(storage.path(name), (modified, modified))
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('recipes/images/a.PNG', ContentFile(b'1'))
+        second = self.storage.save('recipes/images/b.png', ContentFile(b'1'))
+        other = self.storage.save('recipes/images/c.png', ContentFile(b'2'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^recipes/images/(\w\w)/\1\w{62}\.png$')
+        self.assertEqual(self.list_files(), sorted([first, other]))
+
+    def test_concurrent_save_keeps_name(self):
+        content = ContentFile(b'1')
+        name = self.storage.get_content_name('recipes/images/a.png', content)
+        save = self.storage._save
+
+        def concurrent_save(*args):
+            # Параллельная загрузка записала файл после проверки exists().
+            ContentAddressedStorage().save(
+                'recipes/images/b.png', ContentFile(b'1')
+            )
+            return save(*args)
+
+        with mock.patch.object(
+            self.storage, '_save', side_effect=concurrent_save
+        ):
+            saved = self.storage.save('recipes/images/a.png', content)
+        self.assertEqual(saved, name)
+        self.assertEqual(self.list_files(), [name])
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'1')
+
+    def test_gc_media(self):
+        recipe, = self.create_recipes(1)
+        used, unused, fresh = (
+            self.storage.save('recipes/images/image.png', ContentFile(data))
+            for data in (b'used', b'unused', b'fresh')
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(image=used)
+        used_rendition, unused_rendition = (
+            default_storage.save(
+                '{}/{}_small.webp'.format(
+                    RENDITIONS_DIR,
+                    os.path.splitext(os.path.basename(name))[0]
+                ),
+                ContentFile(b'rendition')
+            )
+            for name in (used, unused)
+        )
+        for name in (used, unused, used_rendition, unused_rendition):
+            self.age(default_storage, name)
+        files = self.list_files()
+        call_command('gc_media', '--dry-run', stdout=StringIO())
+        self.assertEqual(self.list_files(), files)
+        call_command('gc_media', stdout=StringIO())
+        self.assertEqual(
+            self.list_files(), sorted([used, fresh, used_rendition])
+        )
+
+
+class RecipeSerializationTests(TestCase):
+    """Быстрая сериализация рецептов даёт тот же JSON, что и поля DRF.
+
+    Данные benchmark_serialization покрывают пустые фамилии, кавычки и
+    спецсимволы в названиях, файлы с пробелами и рецепты без копий
+    изображений.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer, cls.ids = create_recipes(60, 3)
+
+    def setUp(self):
+        tag_registry.version = None
+
+    def render(self, recipes, request, fast):
+        """Возвращает JSON рецептов в том виде, в каком его отдаёт API."""
+        return JSONRenderer().render(serialize(recipes, request, fast))
+
+    def assert_same_json(self, recipes, request):
+        for recipe in recipes:
+            with self.subTest(recipe=recipe.id):
+                self.assertEqual(
+                    self.render([recipe], request, True).decode(),
+                    self.render([recipe], request, False).decode()
+                )
+        self.assertEqual(
+            self.render(recipes, request, True),
+            self.render(recipes, request, False)
+        )
+
+    def get_recipes(self):
+        return Recipe.objects.filter(pk__in=self.ids).prefetch_related(
+            'amount_ingredients__ingredient'
+        ).with_tag_ids()
+
+    def test_user_flags(self):
+        self.assert_same_json(
+            list(self.get_recipes().with_user_flags(self.viewer)),
+            get_request(self.viewer)
+        )
+
+    def test_anonymous(self):
+        anonymous = AnonymousUser()
+        self.assert_same_json(
+            list(self.get_recipes().with_user_flags(anonymous)),
+            get_request(anonymous)
+        )
+
+    def test_without_annotations(self):
+        self.assert_same_json(
+            list(Recipe.objects.filter(pk__in=self.ids[:20])),
+            get_request(self.viewer)
+        )
+
+
+class AsyncURLConf:
+    """Маршруты API с асинхронными вьюхами чтения.
+
+    ASYNC_READ_VIEWS читается при создании вьюх, поэтому маршруты
+    строятся под override_settings.
+    """
+
+    def __init__(self):
+        router = routers.DefaultRouter()
+        router.register('recipes', RecipeViewSet, basename='recipe')
+        router.register('tags', TagViewSet, basename='tag')
+        router.register(
+            'ingredients', IngredientViewSet, basename='ingredient'
+        )
+        self.urlpatterns = [path('api/', include(router.urls))]
+
+
+class AsyncAPITestCase(APIDataMixin, TransactionTestCase):
+    """Тесты API под ASGI.
+
+    Асинхронные вьюхи читают базу из других потоков и соединений, поэтому
+    данные тестов фиксируются, а соединения потоков закрываются после
+    каждого вызова, чтобы не мешать удалению тестовой базы.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.create_data()
+
+
+class AsyncReadViewsTests(AsyncAPITestCase):
+    """Условные запросы к асинхронным вьюхам чтения."""
+
+    def setUp(self):
+        super().setUp()
+        recipe, = self.create_recipes(1)
+        self.urls = (
+            '/api/ingredients/', '/api/tags/', f'/api/recipes/{recipe.id}/'
+        )
+        with self.settings(ASYNC_READ_VIEWS=True):
+            urlconf = AsyncURLConf()
+        override = override_settings(ROOT_URLCONF=urlconf)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    async def test_conditional_get(self):
+        client = AsyncClient()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = await client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                response = await client.get(url, **{'if-none-match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+                response = await client.head(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['ETag'], etag)
+                response = await client.head(
+                    url, **{'if-none-match': etag}
+                )
+                self.assertEqual(response.status_code, 304)
+
+    async def test_etag_matches_sync_views(self):
+        url = '/api/ingredients/'
+        etags = set()
+        for query in (urlencode({'name': 'сол'}), 'name=сол'):
+            with self.subTest(query=query):
+                # WSGI-сервер передаёт байты строки запроса как latin-1.
+                with self.settings(ROOT_URLCONF='foodgram.urls'):
+                    response = await sync_to_async(self.get_client().get)(
+                        url, QUERY_STRING=query.encode().decode('latin-1')
+                    )
+                # AsyncClient в Django 3.2 не переносит data в строку
+                # запроса.
+                async_response = await AsyncClient().get(f'{url}?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(len(response.json()), 3)
+                self.assertEqual(async_response.json(), response.json())
+                etags.update((response['ETag'], async_response['ETag']))
+        self.assertEqual(len(etags), 1)
+
+
+class AsyncShoppingListTests(AsyncAPITestCase):
+    """Скачивание списка покупок под ASGI.
+
+    Сервер ASGI читает потоковый ответ в цикле событий, как и тест.
+    """
+
+    def setUp(self):
+        super().setUp()
+        recipe, = self.create_recipes(1)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.token = Token.objects.create(user=self.user).key
+
+    async def test_download(self):
+        expected = {
+            'txt': 'соль (г) - 1'.encode(),
+            'csv': 'соль,г,1'.encode(),
+            'pdf': b'%PDF',
+        }
+        for async_views in (False, True):
+            with self.settings(ASYNC_READ_VIEWS=async_views):
+                urlconf = AsyncURLConf()
+            for file_format in SHOPPING_LIST_FORMATS:
+                with self.subTest(
+                    async_views=async_views, file_format=file_format
+                ), self.settings(ROOT_URLCONF=urlconf):
+                    response = await AsyncClient().get(
+                        '/api/recipes/download_shopping_cart/'
+                        f'?file_format={file_format}',
+                        authorization=f'Token {self.token}'
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIn(
+                        expected[file_format],
+                        b''.join(response.streaming_content)
+                    )
@@ -1,5 +1,6 @@
 from django.shortcuts import get_object_or_404
 
+from foodgram.db.replicas import pin_primary
 from recipes.models import Recipe
 from users.models import Subscription
 
@@ -14,6 +15,7 @@ def create_object(request, pk, serializer_in, serializer_out, model):
     serializer = serializer_in(data=data)
     serializer.is_valid(raise_exception=True)
     serializer.save()
+    pin_primary(request)
     return serializer_out(obj, context={'request': request})
 
 
@@ -33,3 +35,13 @@ def delete_object(request, pk, model_object, model_for_delete_object):
     )
 
     object.delete()
+    pin_primary(request)
+
+
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit или None."""
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
@@ -1,48 +1,147 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.shortcuts import HttpResponse
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import (
     IsAuthenticated, IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
 
+from foodgram.db.replicas import pin_primary
+from recipes.autocomplete import ingredient_autocomplete
 from recipes.filters import RecipeFilter
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipes, Recipe, ShoppingCart, Tag
+)
+from recipes.tags import tag_registry
 from users.models import Subscription
+
+from .asynchronous import AsyncReadMixin, gather, run, set_prefetched
+from .caching import CachedListMixin, ConditionalGetMixin
+from .pagination import RecipePagination, SubscriptionPagination
 from .permissions import IsOwnerOrReadOnly
 from .serializers import (
     FavoriteSerializer, IngredientSerializer, RecipeFavoriteSerializer,
     RecipeReadSerializer, RecipeWriteSerializer, ShoppingCartSerializer,
     SubscriptionReadSerializer, SubscriptionSerializer, TagSerializer,
-    UserSerializer
+    UserSerializer, get_tags_data
 )
-from .utils import create_object, delete_object
+from .shopping_list import SHOPPING_LIST_FORMATS, shopping_list_response
+from .utils import create_object, delete_object, get_recipes_limit
 
 User = get_user_model()
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    AsyncReadMixin, ConditionalGetMixin, CachedListMixin,
+    viewsets.ModelViewSet
+):
     """Работа с рецептами."""
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
+    async_actions = ('list', 'retrieve')
+    prefetch_ingredients = True
+    cache_resources = ('recipes', 'tags', 'ingredients', 'users')
+    cache_user_state = True
+    conditional_actions = ('retrieve',)
+    list_cache_resources = cache_resources + ('scores',)
+    list_cache_bypass_params = ('is_favorited', 'is_in_shopping_cart')
+    query_budgets = {
+        'list': 10,
+        'retrieve': 6,
+        'favorite': 8,
+        'shopping_cart': 8,
+    }
     permission_classes = (IsOwnerOrReadOnly, IsAuthenticatedOrReadOnly)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_queryset(self):
         """Получает набор запросов с рецептами."""
-        return Recipe.objects.prefetch_related(
-            'amount_ingredients__ingredient', 'tags'
-        ).all()
+        user = AnonymousUser() if self.shared_response else self.request.user
+        queryset = Recipe.objects.with_tag_ids().with_user_flags(user)
+        if self.prefetch_ingredients:
+            queryset = queryset.prefetch_related(
+                'amount_ingredients__ingredient'
+            )
+        return queryset
+
+    async def async_retrieve(self, request, *args, **kwargs):
+        """Выбирает рецепт и его ингредиенты одновременно."""
+        try:
+            recipe_id = Recipe._meta.pk.to_python(
+                self.kwargs[self.lookup_field]
+            )
+        except ValidationError:
+            return await run(self.retrieve, request, *args, **kwargs)
+        self.prefetch_ingredients = False
+        recipe, ingredients = await gather(
+            (self.get_object,),
+            (list, IngredientRecipes.objects.filter(
+                recipe_id=recipe_id
+            ).prefetch_related('ingredient')),
+        )
+        set_prefetched(recipe, 'amount_ingredients', ingredients)
+        return Response(await run(lambda: self.get_serializer(recipe).data))
+
+    def get_user_flag_queries(self, data, user):
+        """Запросы избранного, корзины и подписок для рецептов выдачи."""
+        results = data['results']
+        recipe_ids = [recipe['id'] for recipe in results]
+        author_ids = {recipe['author']['id'] for recipe in results}
+        return (
+            Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True),
+            ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True),
+            Subscription.objects.filter(
+                user=user, author_id__in=author_ids
+            ).values_list('author_id', flat=True),
+        )
+
+    def overlay_user_data(self, data, user):
+        """Проставляет флаги пользователя в общей выдаче рецептов."""
+        return self.apply_user_flags(data, *(
+            set(query) for query in self.get_user_flag_queries(data, user)
+        ))
+
+    async def async_overlay_user_data(self, data, user):
+        """Выбирает флаги пользователя тремя одновременными запросами."""
+        return self.apply_user_flags(data, *await gather(*(
+            (set, query) for query in self.get_user_flag_queries(data, user)
+        )))
+
+    def apply_user_flags(self, data, favorited, in_shopping_cart, subscribed):
+        """Проставляет в выдаче флаги из множеств идентификаторов."""
+        results = data['results']
+        return {**data, 'results': [
+            {
+                **recipe,
+                'author': {
+                    **recipe['author'],
+                    'is_subscribed': recipe['author']['id'] in subscribed,
+                },
+                'is_favorited': recipe['id'] in favorited,
+                'is_in_shopping_cart': recipe['id'] in in_shopping_cart,
+            }
+            for recipe in results
+        ]}
 
     def perform_create(self, serializer):
         """Функция создания рецепта."""
         return serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Удаляет рецепт и закрепляет чтение автора за основной базой."""
+        instance.delete()
+        pin_primary(self.request)
+
     def get_serializer_class(self):
         """Получает сериализатор."""
         if self.action == 'retrieve' or self.action == 'list':
@@ -89,54 +188,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
         """Скачивание списка покупок."""
-        ingredient_lst = ShoppingCart.objects.filter(
-            user=request.user
-        ).values_list(
-            'recipe_id__ingredients__name',
-            'recipe_id__ingredients__measurement_unit',
-            Sum('recipe_id__ingredients__amount_ingredients__amount'))
-
-        shopping_list = ['Список покупок:']
-        ingredient_lst = set(ingredient_lst)
-
-        for ingredient in ingredient_lst:
-            shopping_list.append('{} ({}) - {}'.format(*ingredient))
-
-        response = HttpResponse('\n'.join(shopping_list),
-                                content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
-        )
-        return response
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'file_format': 'Доступные форматы: {}'.format(
+                    ', '.join(SHOPPING_LIST_FORMATS)
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return shopping_list_response(request.user, file_format)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(
+    AsyncReadMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     """Теги."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    async_actions = ('list', 'retrieve')
+    cache_resources = ('tags',)
+    query_budgets = {'list': 2, 'retrieve': 2}
+
+    def list(self, request, *args, **kwargs):
+        """Отдаёт теги из реестра тегов без обращения к базе."""
+        return Response(get_tags_data(tag_registry.all()))
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(
+    AsyncReadMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     """Ингредиенты."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
+    async_actions = ('list', 'retrieve')
+    cache_resources = ('ingredients',)
+    query_budgets = {'list': 2, 'retrieve': 2}
 
     def get_queryset(self):
         """Получает queryset с ингредиентами."""
         ingredients_name = self.request.query_params.get('name')
         if ingredients_name is not None:
-            return Ingredient.objects.all().filter(
-                name__istartswith=ingredients_name
-            )
+            return Ingredient.objects.search(
+                ingredients_name
+            )[:settings.INGREDIENT_SEARCH_LIMIT]
         return Ingredient.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        """Отдаёт ингредиенты из кэша процесса без обращения к базе."""
+        if not settings.INGREDIENT_CACHE_ENABLED:
+            return super().list(request, *args, **kwargs)
+        ingredients_name = request.query_params.get('name')
+        if ingredients_name is not None:
+            ingredients = ingredient_autocomplete.search(ingredients_name)
+        else:
+            ingredients = ingredient_autocomplete.all()
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
 class CustomUserViewSet(UserViewSet):
     """Кастомный юзер."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = SubscriptionPagination
+    query_budgets = {
+        'list': 3,
+        'retrieve': 2,
+        'me': 2,
+        'subscriptions': 4,
+        'subscribe': 10,
+    }
+
+    def get_queryset(self):
+        """Добавляет флаг подписки одним запросом со списком."""
+        return super().get_queryset().with_is_subscribed(self.request.user)
 
     @action(detail=True, methods=['post', 'delete'])
     def subscribe(self, request, id):
@@ -160,7 +287,15 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         """Подписки на авторов."""
         user = request.user
-        authors = User.objects.filter(subscribing__user=user)
+        authors = User.objects.filter(
+            subscribing__user=user
+        ).with_is_subscribed(user).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.latest_per_author(
+                get_recipes_limit(request)
+            ),
+            to_attr='recipes_preview'
+        ))
 
         paged_queryset = self.paginate_queryset(authors)
         serializer = SubscriptionReadSerializer(
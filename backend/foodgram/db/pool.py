@@ -0,0 +1,202 @@
+import os
+import time
+from threading import Condition, Lock
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from foodgram.metrics import database_registry
+
+
+class PoolTimeout(Exception):
+    """Пул не выдал соединение за отведённое время."""
+
+
+class ConnectionPool:
+    """Пул соединений процесса для потоковых и ASGI-воркеров.
+
+    Соединение выдаётся потоку на время между открытием и закрытием
+    соединения Django и затем возвращается в пул, поэтому число открытых
+    соединений процесса не превышает size при любом числе потоков. Если
+    свободных соединений нет, поток ждёт до timeout секунд. Соединения
+    старше max_age закрываются, а простоявшие дольше check_interval
+    перед выдачей проверяются запросом SELECT 1.
+    """
+
+    def __init__(self, alias, size, timeout, max_age=None,
+                 check_interval=None):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.condition = Condition()
+        self.idle = []
+        self.opened_at = {}
+        self.total = 0
+
+    def record(self, **values):
+        database_registry.record((self.alias,), values)
+
+    def acquire(self, connect):
+        """Выдаёт соединение из пула или открывает его через connect()."""
+        started = None
+        while True:
+            with self.condition:
+                while not self.idle and self.total >= self.size:
+                    now = time.monotonic()
+                    if started is None:
+                        started = now
+                        self.record(db_pool_waits_total=1)
+                    remaining = started + self.timeout - now
+                    if remaining <= 0:
+                        self.record(
+                            db_pool_timeouts_total=1,
+                            db_pool_wait_seconds_total=now - started,
+                        )
+                        raise PoolTimeout(
+                            f'Нет свободного соединения с базой '
+                            f'{self.alias} за {self.timeout:g} с '
+                            f'(размер пула {self.size}).'
+                        )
+                    self.condition.wait(remaining)
+                if self.idle:
+                    connection, released_at = self.idle.pop()
+                else:
+                    connection, released_at = None, None
+                    self.total += 1
+            if started is not None:
+                self.record(
+                    db_pool_wait_seconds_total=time.monotonic() - started
+                )
+                started = None
+            if connection is None:
+                return self.open(connect)
+            if self.is_usable(connection, released_at):
+                self.record(db_pool_checkouts_total=1)
+                return connection
+            self.discard(connection)
+
+    def open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.total -= 1
+                self.condition.notify()
+            raise
+        self.opened_at[id(connection)] = time.monotonic()
+        self.record(db_connections_opened_total=1, db_pool_checkouts_total=1)
+        return connection
+
+    def is_usable(self, connection, released_at):
+        """Проверяет соединение из пула перед выдачей."""
+        now = time.monotonic()
+        if connection.closed or self.is_expired(connection, now):
+            return False
+        if (
+            self.check_interval is None
+            or now - released_at < self.check_interval
+        ):
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except Exception:
+            self.record(db_health_checks_failed_total=1)
+            return False
+        return True
+
+    def is_expired(self, connection, now):
+        return self.max_age is not None and (
+            now - self.opened_at.get(id(connection), now) >= self.max_age
+        )
+
+    def release(self, connection):
+        """Возвращает соединение в пул или закрывает его.
+
+        Незавершённая транзакция откатывается, сломанные и устаревшие
+        соединения закрываются.
+        """
+        if not connection.closed and not self.is_expired(
+            connection, time.monotonic()
+        ):
+            try:
+                if connection.get_transaction_status() != (
+                    TRANSACTION_STATUS_IDLE
+                ):
+                    connection.rollback()
+            except Exception:
+                pass
+            else:
+                with self.condition:
+                    self.idle.append((connection, time.monotonic()))
+                    self.condition.notify()
+                return
+        self.discard(connection)
+
+    def clear(self):
+        """Закрывает свободные соединения пула."""
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def discard(self, connection):
+        """Закрывает соединение и освобождает место в пуле."""
+        self.opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self.record(db_connections_closed_total=1)
+        with self.condition:
+            self.total -= 1
+            self.condition.notify()
+
+
+pools = {}
+pools_lock = Lock()
+
+
+def get_target(settings_dict):
+    return tuple(
+        settings_dict.get(name) for name in ('NAME', 'HOST', 'PORT', 'USER')
+    )
+
+
+def clear_pools(name):
+    """Закрывает свободные соединения всех пулов базы name процесса."""
+    with pools_lock:
+        matching = [
+            pool for key, pool in pools.items()
+            if key[1] == os.getpid() and key[2] == name
+        ]
+    for pool in matching:
+        pool.clear()
+
+
+def get_pool(alias, settings_dict):
+    """Возвращает пул соединений процесса для базы alias.
+
+    Параметры берутся из POOL настроек базы, проверки соединений
+    включаются CONN_HEALTH_CHECKS. Пул привязан к адресу базы, так что
+    смена NAME, например при создании тестовой базы, даёт новый пул.
+    После fork пул создаётся заново, чтобы процессы gunicorn не делили
+    соединения родителя.
+    """
+    key = (alias, os.getpid(), *get_target(settings_dict))
+    with pools_lock:
+        if key not in pools:
+            options = settings_dict['POOL']
+            pools[key] = ConnectionPool(
+                alias,
+                size=options['SIZE'],
+                timeout=options.get('TIMEOUT', 10),
+                max_age=options.get('MAX_AGE'),
+                check_interval=(
+                    options.get('CHECK_INTERVAL')
+                    if settings_dict.get('CONN_HEALTH_CHECKS') else None
+                ),
+            )
+        return pools[key]
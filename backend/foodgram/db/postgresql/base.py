@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import Database
+
+from foodgram.metrics import database_registry
+from ..pool import PoolTimeout, get_pool
+from .creation import DatabaseCreation
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой постоянных соединений и пулом процесса.
+
+    При CONN_HEALTH_CHECKS, как в Django 4.1, соединение, оставшееся от
+    прошлого HTTP-запроса, перед первым запросом проверяется через
+    SELECT 1 и при ошибке открывается заново. Если задан POOL,
+    соединения берутся из пула процесса и возвращаются в него вместо
+    закрытия. Открытия и закрытия соединений попадают в метрики.
+    """
+    creation_class = DatabaseCreation
+
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        self.health_check_enabled = settings_dict.get(
+            'CONN_HEALTH_CHECKS', False
+        )
+        self.health_check_done = False
+        self.pooled = bool(settings_dict.get('POOL'))
+
+    def record(self, **values):
+        database_registry.record((self.alias,), values)
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        if not self.pooled:
+            connection = connect()
+            self.record(db_connections_opened_total=1)
+            return connection
+        try:
+            return get_pool(self.alias, self.settings_dict).acquire(connect)
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.pooled:
+            get_pool(self.alias, self.settings_dict).release(self.connection)
+            return
+        try:
+            super()._close()
+        finally:
+            self.record(db_connections_closed_total=1)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        """Закрывает соединение, если оно не отвечает на SELECT 1."""
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+            or self.in_atomic_block
+        ):
+            return
+        if not self.is_usable():
+            self.record(db_health_checks_failed_total=1)
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,11 @@
+from django.db.backends.postgresql import creation
+
+from ..pool import clear_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """Создание тестовой базы с учётом пула соединений."""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        clear_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connections,
+    transaction
+)
+
+from foodgram.metrics import database_registry
+
+from .pool import get_target
+
+PIN_KEY_PREFIX = 'primary-pin:'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Отставание реплики PostgreSQL в секундах. Реплика, которая применила
+# всё полученное, не отстаёт, даже если давно не было записей.
+LAG_QUERY = (
+    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+read_database = ContextVar('read_database', default=None)
+
+
+@contextmanager
+def use_primary():
+    """Направляет чтение внутри блока в основную базу."""
+    token = read_database.set(None)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def replica_may_lag(version):
+    """Проверяет, могла ли реплика текущего запроса не получить изменение.
+
+    version — версия ресурса из foodgram.versions, то есть время его
+    изменения в наносекундах.
+    """
+    return read_database.get() is not None and (
+        time.time_ns() - version < settings.REPLICA_MAX_LAG * 10 ** 9
+    )
+
+
+def get_pin_cache():
+    """Кэш закреплений, общий для всех процессов, как и кэш версий."""
+    return caches[settings.VERSION_CACHE_ALIAS]
+
+
+def get_pin_key(request):
+    """Возвращает ключ закрепления по токену или сессии запроса."""
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return PIN_KEY_PREFIX + hashlib.sha256(credentials.encode()).hexdigest()
+
+
+def pin_primary(request):
+    """Закрепляет чтение пользователя за основной базой после записи.
+
+    После фиксации транзакции и в течение REPLICA_MAX_LAG секунд запросы
+    с теми же токеном или сессией читают из основной базы и видят своё
+    изменение, даже если реплики его ещё не получили.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return
+    key = get_pin_key(request)
+    if key is not None:
+        transaction.on_commit(lambda: get_pin_cache().set(
+            key, True, timeout=settings.REPLICA_MAX_LAG
+        ))
+
+
+def get_replicas():
+    """Возвращает реплики чтения из DATABASE_REPLICAS.
+
+    Реплика с адресом основной базы, например её зеркало в тестах,
+    пропускается: её соединение не видит незафиксированных изменений
+    основного.
+    """
+    primary = get_target(connections[DEFAULT_DB_ALIAS].settings_dict)
+    return [
+        alias for alias in settings.DATABASE_REPLICAS
+        if get_target(connections[alias].settings_dict) != primary
+    ]
+
+
+def check_replica(alias):
+    """Проверяет, что реплика доступна и отстаёт не больше допустимого."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                LAG_QUERY if connection.vendor == 'postgresql' else 'SELECT 1'
+            )
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return False
+    return lag is not None and float(lag) <= settings.REPLICA_MAX_LAG
+
+
+class ReplicaHealth:
+    """Состояние реплик чтения в памяти процесса.
+
+    Каждая реплика проверяется не чаще раза в REPLICA_CHECK_INTERVAL
+    секунд одним из запросов. Недоступные и отстающие реплики не
+    получают чтение до следующей успешной проверки.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.states = {}
+
+    def get_stale(self):
+        """Возвращает реплики, которые пора проверить."""
+        now = time.monotonic()
+        return [
+            alias for alias in get_replicas()
+            if alias not in self.states
+            or now - self.states[alias][1] >= settings.REPLICA_CHECK_INTERVAL
+        ]
+
+    def refresh(self):
+        """Проверяет реплики, у которых истёк интервал проверки."""
+        with self.lock:
+            stale = self.get_stale()
+            now = time.monotonic()
+            for alias in stale:
+                # Остальные потоки до конца проверки пользуются
+                # прежним состоянием и не проверяют реплику повторно.
+                healthy, _ = self.states.get(alias, (False, None))
+                self.states[alias] = (healthy, now)
+        for alias in stale:
+            healthy = check_replica(alias)
+            if not healthy:
+                database_registry.record(
+                    (alias,), {'db_replica_checks_failed_total': 1}
+                )
+            with self.lock:
+                self.states[alias] = (healthy, time.monotonic())
+
+    def choose(self):
+        """Возвращает случайную исправную реплику или None."""
+        healthy = [
+            alias for alias in get_replicas()
+            if self.states.get(alias, (False, None))[0]
+        ]
+        if not healthy:
+            database_registry.record(
+                (DEFAULT_DB_ALIAS,), {'db_replica_fallbacks_total': 1}
+            )
+            return None
+        alias = random.choice(healthy)
+        database_registry.record((alias,), {'db_replica_requests_total': 1})
+        return alias
+
+
+replica_health = ReplicaHealth()
+
+
+def is_replica_request(request):
+    """Проверяет, можно ли читать данные для запроса с реплики."""
+    return request.method in SAFE_METHODS and request.path.startswith(
+        settings.REPLICA_READ_PATHS
+    )
+
+
+def select_read_database(request):
+    """Возвращает реплику для чтения или None для основной базы."""
+    if not is_replica_request(request):
+        return None
+    key = get_pin_key(request)
+    if key is not None and get_pin_cache().get(key):
+        database_registry.record(
+            (DEFAULT_DB_ALIAS,), {'db_replica_pinned_total': 1}
+        )
+        return None
+    if replica_health.get_stale():
+        replica_health.refresh()
+    return replica_health.choose()
+
+
+class ReplicaRouter:
+    """Роутер баз: чтение безопасных запросов API идёт на реплики.
+
+    Базу чтения выбирает ReplicaMiddleware. Запись, чтение вне HTTP и
+    приложения primary_apps всегда используют основную базу: токены и
+    сессии нужны сразу после создания, а запросы к ним дешёвые.
+    """
+    primary_apps = ('authtoken', 'sessions')
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.primary_apps:
+            return DEFAULT_DB_ALIAS
+        return read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Выбирает базу чтения для запроса.
+
+    GET, HEAD и OPTIONS к REPLICA_READ_PATHS читают со случайной
+    исправной реплики из DATABASE_REPLICAS, если пользователь недавно
+    ничего не менял (pin_primary). Без реплик мидлвар отключается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = read_database.set(select_read_database(request))
+        try:
+            return self.get_response(request)
+        finally:
+            read_database.reset(token)
+
+    async def __acall__(self, request):
+        if not is_replica_request(request):
+            database = None
+        elif get_pin_key(request) is None and not replica_health.get_stale():
+            database = replica_health.choose()
+        else:
+            # Закрепление и проверка реплик обращаются к кэшу и базе.
+            def select():
+                try:
+                    return select_read_database(request)
+                finally:
+                    close_old_connections()
+            database = await sync_to_async(
+                select, thread_sensitive=False
+            )()
+        token = read_database.set(database)
+        try:
+            return await self.get_response(request)
+        finally:
+            read_database.reset(token)
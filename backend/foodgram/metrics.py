@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+COUNTERS = (
+    ('requests_total', 'Количество запросов.'),
+    ('db_queries_total', 'Количество SQL-запросов.'),
+    ('db_seconds_total', 'Время выполнения SQL-запросов.'),
+    ('serialization_seconds_total', 'Время построения и кодирования ответов.'),
+    ('request_seconds_total', 'Полное время обработки запросов.'),
+    ('response_bytes_total', 'Объём тел ответов, кроме потоковых.'),
+    ('query_budget_exceeded_total', 'Количество превышений бюджета запросов.'),
+)
+DATABASE_COUNTERS = (
+    ('db_connections_opened_total', 'Открытые соединения с базой.'),
+    ('db_connections_closed_total', 'Закрытые соединения с базой.'),
+    ('db_health_checks_failed_total', 'Соединения, не прошедшие проверку.'),
+    ('db_pool_checkouts_total', 'Соединения, выданные пулом.'),
+    ('db_pool_waits_total', 'Ожидания свободного соединения в пуле.'),
+    ('db_pool_wait_seconds_total', 'Время ожидания соединения в пуле.'),
+    ('db_pool_timeouts_total', 'Запросы к пулу, не дождавшиеся соединения.'),
+    ('db_replica_requests_total', 'Запросы, читавшие с реплики.'),
+    ('db_replica_pinned_total', 'Запросы, закреплённые за основной базой.'),
+    ('db_replica_fallbacks_total', 'Запросы без исправной реплики.'),
+    ('db_replica_checks_failed_total', 'Неудачные проверки реплик.'),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Эндпоинт выполнил больше SQL-запросов, чем указано в query_budgets."""
+
+
+class RequestMetrics:
+    """Измерения одного HTTP-запроса.
+
+    Запросы к базе считаются и из потоков, в которых асинхронные вьюхи
+    выполняют ORM, поэтому счётчики защищены блокировкой.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialization_time = 0.0
+        self.serializing = False
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.queries += 1
+                self.sql_time += duration
+
+    def get_action(self, request):
+        """Возвращает действие вьюсета, которое обработало запрос."""
+        actions = getattr(self.view, 'actions', None) or {}
+        return actions.get(request.method.lower())
+
+    def get_budget(self, request):
+        """Возвращает бюджет запросов из query_budgets класса вьюсета."""
+        budgets = getattr(
+            getattr(self.view, 'cls', None), 'query_budgets', None
+        ) or {}
+        return budgets.get(self.get_action(request))
+
+
+def execute_with_metrics(execute, sql, params, many, context):
+    """execute_wrapper соединений: передаёт запрос метрикам текущего запроса.
+
+    Метрики берутся из контекстной переменной, которую sync_to_async
+    копирует в рабочие потоки, поэтому учитываются запросы из любого
+    потока, обслуживающего HTTP-запрос.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """Подключает execute_with_metrics к соединению с базой."""
+    if execute_with_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_with_metrics)
+
+
+connection_created.connect(install_execute_wrapper)
+
+
+@contextmanager
+def track_serialization():
+    """Учитывает время сериализации в метриках текущего запроса.
+
+    Вложенные вызовы и SQL-запросы, выполненные во время сериализации,
+    повторно не учитываются.
+    """
+    metrics = current_metrics.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    sql_time = metrics.sql_time
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_time += (
+            time.perf_counter() - started - (metrics.sql_time - sql_time)
+        )
+        metrics.serializing = False
+
+
+class MetricsRegistry:
+    """Счётчики в памяти процесса с набором меток label_names."""
+
+    def __init__(self, names, label_names):
+        self.names = names
+        self.label_names = label_names
+        self.lock = Lock()
+        self.counters = defaultdict(lambda: defaultdict(float))
+
+    def record(self, labels, values):
+        """Прибавляет значения к счётчикам с метками labels."""
+        with self.lock:
+            counters = self.counters[labels]
+            for name, value in values.items():
+                counters[name] += value
+
+    def render(self):
+        """Возвращает счётчики в текстовом формате Prometheus."""
+        with self.lock:
+            counters = {
+                labels: dict(values)
+                for labels, values in self.counters.items()
+            }
+        lines = []
+        for name, description in self.names:
+            lines.append(f'# HELP foodgram_{name} {description}')
+            lines.append(f'# TYPE foodgram_{name} counter')
+            for labels, values in sorted(counters.items()):
+                label_text = ','.join(
+                    f'{label_name}="{label}"'
+                    for label_name, label in zip(self.label_names, labels)
+                )
+                lines.append(
+                    f'foodgram_{name}{{{label_text}}} {values.get(name, 0):g}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(COUNTERS, ('endpoint', 'method'))
+database_registry = MetricsRegistry(DATABASE_COUNTERS, ('database',))
+
+
+class RequestMetricsMiddleware:
+    """Собирает метрики запросов по эндпоинтам.
+
+    Эндпоинт определяется именем маршрута, например recipe-list или
+    user-subscriptions. Число запросов, время SQL и сериализации
+    попадают в заголовок Server-Timing при SERVER_TIMING_ENABLED и в
+    счётчики для metrics_view. Вьюсет может объявить query_budgets:
+    при превышении бюджета действия пишется предупреждение, а при
+    QUERY_BUDGET_RAISE выбрасывается QueryBudgetExceeded, чтобы
+    тесты падали. Тело потокового ответа строится уже после мидлвара,
+    поэтому его запросы не учитываются и бюджет для таких действий не
+    задаётся.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Признак, по которому Django, как и у MiddlewareMixin,
+            # вызывает мидлвар в асинхронном режиме.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        for connection in connections.all():
+            install_execute_wrapper(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        """Записывает метрики запроса и проверяет бюджет запросов."""
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        endpoint = match.url_name if match is not None else None
+        metrics.view = match.func if match is not None else None
+        budget = metrics.get_budget(request)
+        exceeded = budget is not None and metrics.queries > budget
+        registry.record((endpoint or 'unresolved', request.method), {
+            'requests_total': 1,
+            'db_queries_total': metrics.queries,
+            'db_seconds_total': metrics.sql_time,
+            'serialization_seconds_total': metrics.serialization_time,
+            'request_seconds_total': duration,
+            'response_bytes_total': (
+                0 if response.streaming else len(response.content)
+            ),
+            'query_budget_exceeded_total': int(exceeded),
+        })
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = (
+                f'db;dur={metrics.sql_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries", '
+                f'serialization;dur={metrics.serialization_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        if exceeded:
+            message = (
+                f'{request.method} {endpoint} '
+                f'({metrics.get_action(request)}): {metrics.queries} '
+                f'SQL-запросов при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def metrics_view(request):
+    """Отдаёт счётчики запросов и соединений процесса для Prometheus.
+
+    Счётчики хранятся в памяти процесса: каждый воркер gunicorn отдаёт
+    только свои, а запрос к адресу попадает к одному из воркеров. Адрес
+    не проксируется nginx и доступен только внутри сети контейнеров.
+    """
+    return HttpResponse(
+        registry.render() + database_registry.render(),
+        content_type='text/plain; version=0.0.4'
+    )
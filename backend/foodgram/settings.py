@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
@@ -29,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.db.replicas.ReplicaMiddleware',
+    'foodgram.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,19 +61,57 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+POSTGRES_CONN_MAX_AGE = int(os.getenv('POSTGRES_CONN_MAX_AGE', 60))
+POSTGRES_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
         # 'ENGINE': 'django.db.backends.sqlite3',
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         # 'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL_SIZE else POSTGRES_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('POSTGRES_CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
+        'POOL': {
+            'SIZE': POSTGRES_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('POSTGRES_POOL_TIMEOUT', 10)),
+            'MAX_AGE': POSTGRES_CONN_MAX_AGE,
+            'CHECK_INTERVAL': float(
+                os.getenv('POSTGRES_POOL_CHECK_INTERVAL', 10)
+            ),
+        } if POSTGRES_POOL_SIZE else None,
     }
 }
 
+# Реплики чтения: адреса host[:port][/name] через пробел. Остальные
+# параметры берутся из основной базы, в тестах реплики её зеркалируют.
+DATABASE_REPLICAS = []
+for index, address in enumerate(
+    os.getenv('POSTGRES_REPLICAS', '').split(), start=1
+):
+    address, _, name = address.partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db.replicas.ReplicaRouter']
+REPLICA_READ_PATHS = ('/api/',)
+REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,6 +144,34 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'versions': {
+        'BACKEND': os.getenv(
+            'VERSION_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'VERSION_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache', 'versions')
+        ),
+        'TIMEOUT': None,
+    },
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300)),
+    },
+}
+
+VERSION_CACHE_ALIAS = 'versions'
+RESPONSE_CACHE_ALIAS = 'responses'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -116,6 +185,17 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
 
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 
@@ -134,3 +214,40 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny'],
     }
 }
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_CACHE_ENABLED = os.getenv('INGREDIENT_CACHE_ENABLED', 'True') == 'True'
+INGREDIENT_CACHE_TTL = int(os.getenv('INGREDIENT_CACHE_TTL', 300))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+TAG_CACHE_TTL = int(os.getenv('TAG_CACHE_TTL', 300))
+
+# 0 — ранжировать все совпадения поиска, см. RecipeQuerySet.search.
+RECIPE_SEARCH_LIMIT = int(os.getenv('RECIPE_SEARCH_LIMIT', 0))
+RECIPE_FAST_SERIALIZATION = (
+    os.getenv('RECIPE_FAST_SERIALIZATION', 'True') == 'True'
+)
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'False') == 'True'
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', 'False') == 'True'
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 20 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40_000_000))
+RECIPE_IMAGE_RENDITIONS = {
+    'detail': (1280, 1280),
+    'card': (480, 480),
+    'thumbnail': (160, 160),
+}
+RECIPE_IMAGE_FORMATS = os.getenv('RECIPE_IMAGE_FORMATS', 'webp avif').split()
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
@@ -0,0 +1,107 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from foodgram.db.replicas import use_primary
+
+KEY_PREFIX = 'version:'
+
+
+def get_cache():
+    """Возвращает кэш, общий для всех процессов приложения."""
+    return caches[settings.VERSION_CACHE_ALIAS]
+
+
+def get_versions(*names):
+    """Возвращает версии ресурсов в виде отметок времени в наносекундах.
+
+    Отсутствующая версия инициализируется текущим временем, чтобы все
+    процессы получили одно и то же значение.
+    """
+    cache = get_cache()
+    keys = {name: KEY_PREFIX + name for name in names}
+    versions = cache.get_many(keys.values())
+    result = {}
+    for name, key in keys.items():
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+        result[name] = versions[key]
+    return result
+
+
+def get_version(name):
+    """Возвращает версию одного ресурса."""
+    return get_versions(name)[name]
+
+
+def set_versions(*names):
+    """Сразу присваивает ресурсам новую версию."""
+    now = time.time_ns()
+    get_cache().set_many(
+        {KEY_PREFIX + name: now for name in names}, timeout=None
+    )
+
+
+def bump_version(*names):
+    """Отмечает изменение ресурсов после фиксации текущей транзакции.
+
+    Иначе параллельный запрос мог бы сохранить в кэше ещё не изменённые
+    данные под новой версией.
+    """
+    transaction.on_commit(lambda: set_versions(*names))
+
+
+class VersionedSnapshot:
+    """Данные в памяти процесса, согласованные по версии ресурса.
+
+    Снимок перестраивается методом build(), когда меняется версия
+    version_name в общем кэше версий или истекает время из настройки
+    ttl_setting. Снимок читается из основной базы: реплика могла ещё не
+    получить изменение, на которое указывает новая версия.
+    """
+    version_name = None
+    ttl_setting = None
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.loaded_at = 0
+        self.data = None
+
+    def build(self):
+        """Строит снимок данных."""
+        raise NotImplementedError
+
+    def get(self):
+        """Возвращает актуальный снимок."""
+        version = get_version(self.version_name)
+        expired = (
+            time.monotonic() - self.loaded_at
+            > getattr(settings, self.ttl_setting)
+        )
+        if version == self.version and not expired:
+            return self.data
+        with self.lock:
+            if version != self.version or expired:
+                with use_primary():
+                    self.data = self.build()
+                self.version = version
+                self.loaded_at = time.monotonic()
+        return self.data
+
+    def invalidate(self):
+        """Сбрасывает снимок во всех процессах после фиксации транзакции.
+
+        Локальный снимок сбрасывается вместе с версией: иначе запрос этого
+        процесса мог бы до фиксации собрать снимок из незафиксированных
+        данных и сохранить его под старой версией.
+        """
+        def reset():
+            set_versions(self.version_name)
+            self.version = None
+
+        transaction.on_commit(reset)
@@ -40,7 +40,9 @@ class TagInline(InlineBase):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """Рецепты."""
-    list_display = ('id', 'name', 'author', 'pub_date', 'faivorites_count')
+    list_display = (
+        'id', 'name', 'author', 'pub_date', 'favorites_count', 'carts_count'
+    )
     list_filter = ('author', 'name', 'tags')
     exclude = ('tags',)
     inlines = [IngredientRecipeInline, TagInline]
@@ -0,0 +1,54 @@
+from bisect import bisect_left
+
+from django.conf import settings
+
+from foodgram.versions import VersionedSnapshot
+from .models import Ingredient
+
+
+class IngredientAutocomplete(VersionedSnapshot):
+    """Кэш таблицы ингредиентов в памяти процесса для автодополнения.
+
+    Снимок таблицы перечитывается, когда меняется версия ingredients
+    в общем кэше версий или истекает INGREDIENT_CACHE_TTL.
+    """
+    version_name = 'ingredients'
+    ttl_setting = 'INGREDIENT_CACHE_TTL'
+
+    def build(self):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: ingredient.name.lower()
+        )
+        keys = [ingredient.name.lower() for ingredient in ingredients]
+        return ingredients, keys
+
+    def load(self):
+        """Возвращает актуальный снимок таблицы ингредиентов."""
+        return self.get()
+
+    def all(self):
+        """Возвращает все ингредиенты."""
+        return self.load()[0]
+
+    def search(self, query, limit=None):
+        """Ищет ингредиенты: сначала по началу названия, затем по вхождению."""
+        ingredients, keys = self.load()
+        query = query.lower()
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = ingredients[start:min(end, start + limit)]
+        if len(result) < limit and query:
+            for index, key in enumerate(keys):
+                if query in key and not start <= index < end:
+                    result.append(ingredients[index])
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_autocomplete = IngredientAutocomplete()
@@ -1,6 +1,46 @@
+from django import forms
+from django.conf import settings
+from django.db.models import F
+from django_filters.fields import BaseCSVField
 from django_filters.rest_framework import FilterSet, filters
 
-from .models import Recipe, Tag
+from .models import Recipe
+from .tags import tag_registry
+
+
+class UniqueCSVField(BaseCSVField):
+    """Список значений через запятую без повторов."""
+
+    def clean(self, value):
+        value = super().clean(value)
+        return value if value is None else list(dict.fromkeys(value))
+
+
+class IntegerInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Фильтр по списку целых чисел через запятую."""
+    base_field_class = UniqueCSVField
+    field_class = forms.IntegerField
+
+
+class RecipeFilterForm(forms.Form):
+    """Форма фильтра рецептов с проверкой связанных параметров."""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (
+            cleaned_data.get('max_missing') is not None
+            and not cleaned_data.get('ingredients_any')
+        ):
+            self.add_error(
+                'max_missing',
+                'Параметр max_missing задаётся вместе с ingredients_any.'
+            )
+        return cleaned_data
+
+
+def get_tag_choices():
+    """Возвращает варианты слагов тегов из реестра тегов."""
+    return [(slug, slug) for slug in tag_registry.get_slugs()]
 
 
 class RecipeFilter(FilterSet):
@@ -11,19 +51,43 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags'
+    )
+    tags_all = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags_all'
+    )
+    ingredients_all = IntegerInFilter(method='get_ingredients_all')
+    ingredients_any = IntegerInFilter(method='get_ingredients_any')
+    max_missing = filters.NumberFilter(
+        method='get_max_missing',
+        min_value=0
+    )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'В тренде'),
+        ),
+        method='get_ordering'
     )
 
     class Meta:
         model = Recipe
+        form = RecipeFilterForm
         fields = (
             'is_favorited',
             'is_in_shopping_cart',
             'tags',
+            'tags_all',
             'author',
+            'ingredients_all',
+            'ingredients_any',
+            'max_missing',
+            'search',
+            'ordering',
         )
 
     def get_is_favorited(self, queryset, name, value):
@@ -35,3 +99,48 @@ class RecipeFilter(FilterSet):
         """Получает queryset с рецептами в корзине."""
         return queryset.filter(
             cart__user=self.request.user) if value else queryset
+
+    def get_tags(self, queryset, name, value):
+        """Получает рецепты хотя бы с одним из тегов."""
+        return queryset.with_tags(tag_registry.get_ids(value))
+
+    def get_tags_all(self, queryset, name, value):
+        """Получает рецепты со всеми тегами."""
+        return queryset.with_tags(tag_registry.get_ids(value), match_all=True)
+
+    def get_ingredients_all(self, queryset, name, value):
+        """Получает рецепты, в которых есть все ингредиенты."""
+        return queryset.filter(ingredient_ids__contains=value)
+
+    def get_ingredients_any(self, queryset, name, value):
+        """Получает рецепты, в которых есть хотя бы один ингредиент.
+
+        Вместе с max_missing список считается набором продуктов
+        пользователя, и остаются рецепты, которым не хватает не больше
+        max_missing ингредиентов.
+        """
+        max_missing = self.form.cleaned_data.get('max_missing')
+        return queryset.with_ingredients(
+            value, None if max_missing is None else int(max_missing)
+        )
+
+    def get_max_missing(self, queryset, name, value):
+        """Учитывается в get_ingredients_any, без него не допускается."""
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        """Ищет рецепты по названию, ингредиентам и описанию."""
+        if not value.strip():
+            return queryset
+        return queryset.search(value, settings.RECIPE_SEARCH_LIMIT)
+
+    def get_ordering(self, queryset, name, value):
+        """Сортирует рецепты по заранее рассчитанному рейтингу.
+
+        Рейтинг есть у каждого рецепта, поэтому соединение внутреннее и
+        страница читается по индексу рейтинга; равные оценки
+        упорядочиваются по id.
+        """
+        return queryset.filter(score__isnull=False).order_by(
+            F(f'score__{value}').desc(), '-id'
+        )
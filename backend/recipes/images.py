@@ -0,0 +1,146 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram.versions import bump_version
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+FORMATS = {
+    'webp': 'WEBP',
+    'avif': 'AVIF',
+}
+
+executor = None
+executor_lock = Lock()
+
+
+def get_formats():
+    """Возвращает форматы копий, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.RECIPE_IMAGE_FORMATS
+        if FORMATS.get(image_format) in Image.SAVE
+    ]
+
+
+def get_rendition_name(image_name, rendition, image_format):
+    """Возвращает имя файла копии изображения."""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{RENDITIONS_DIR}/{stem}_{rendition}.{image_format}'
+
+
+def render(image, image_format):
+    """Кодирует изображение в заданный формат."""
+    buffer = io.BytesIO()
+    image.save(
+        buffer, FORMATS[image_format], quality=settings.RECIPE_IMAGE_QUALITY
+    )
+    return buffer.getvalue()
+
+
+def make_renditions(recipe_id, overwrite=False):
+    """Создаёт уменьшенные копии изображения рецепта.
+
+    Имена копий выводятся из имени изображения, которое совпадает с хэшем
+    содержимого, поэтому готовые копии используются повторно, если не
+    задан overwrite. Копии строятся от большей к меньшей, каждая
+    следующая уменьшается из предыдущей. Если изображение рецепта успело
+    смениться, результат не сохраняется.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    image_name = recipe.image.name
+    sizes = sorted(
+        settings.RECIPE_IMAGE_RENDITIONS.items(),
+        key=lambda item: item[1][0] * item[1][1],
+        reverse=True
+    )
+    renditions = {
+        rendition: {
+            image_format: get_rendition_name(
+                image_name, rendition, image_format
+            )
+            for image_format in get_formats()
+        }
+        for rendition, _ in sizes
+    }
+    missing = {
+        name for files in renditions.values() for name in files.values()
+        if overwrite or not default_storage.exists(name)
+    }
+    if missing:
+        with recipe.image.open('rb') as image_file:
+            with Image.open(image_file) as image:
+                image.draft('RGB', sizes[0][1])
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'RGBA'):
+                    alpha = (
+                        'A' in image.getbands()
+                        or 'transparency' in image.info
+                    )
+                    image = image.convert('RGBA' if alpha else 'RGB')
+                for rendition, size in sizes:
+                    image.thumbnail(size, Image.LANCZOS)
+                    for image_format, name in renditions[rendition].items():
+                        if name not in missing:
+                            continue
+                        default_storage.delete(name)
+                        renditions[rendition][image_format] = (
+                            default_storage.save(
+                                name, ContentFile(render(image, image_format))
+                            )
+                        )
+    if Recipe.objects.filter(
+        pk=recipe_id, image=image_name
+    ).update(renditions=renditions):
+        bump_version('recipes')
+
+
+def process_renditions(recipe_id):
+    """Создаёт копии в фоновом потоке и освобождает его соединения."""
+    try:
+        make_renditions(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось создать копии изображения рецепта %s', recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    """Возвращает пул потоков обработки изображений текущего процесса."""
+    global executor
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=settings.RECIPE_IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images'
+                )
+    return executor
+
+
+def schedule_renditions(recipe_id):
+    """Ставит создание копий в очередь после фиксации транзакции.
+
+    При RECIPE_IMAGE_WORKERS = 0 копии создаются сразу в текущем потоке.
+    """
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(process_renditions, recipe_id)
+        )
+    else:
+        transaction.on_commit(lambda: make_renditions(recipe_id))
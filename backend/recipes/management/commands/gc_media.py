@@ -0,0 +1,96 @@
+import os
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from recipes.images import RENDITIONS_DIR
+from recipes.models import Recipe
+
+
+def walk(storage, path):
+    """Перечисляет файлы каталога хранилища вместе с подкаталогами."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+def get_stem(name):
+    """Возвращает имя файла без каталога и расширения."""
+    return os.path.splitext(posixpath.basename(name))[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и их уменьшенные копии, '
+        'на которые не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help=(
+                'Не удалять файлы моложе заданного числа минут: они могут '
+                'принадлежать ещё не сохранённым рецептам.'
+            )
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько файлов будет удалено.'
+        )
+
+    def get_referenced(self):
+        """Потоково читает таблицу рецептов и собирает имена изображений."""
+        images = set(
+            Recipe.objects.values_list('image', flat=True).iterator(
+                chunk_size=5000
+            )
+        )
+        return images, {get_stem(image) for image in images}
+
+    def get_garbage(self, images, stems):
+        """Перечисляет неиспользуемые файлы.
+
+        Копия изображения считается используемой, пока используется
+        изображение, из которого она получена.
+        """
+        image_field = Recipe._meta.get_field('image')
+        image_storage = image_field.storage
+        for name in walk(image_storage, image_field.upload_to):
+            if name not in images:
+                yield image_storage, name
+        for name in walk(default_storage, RENDITIONS_DIR):
+            if get_stem(name).rsplit('_', 1)[0] not in stems:
+                yield default_storage, name
+
+    def handle(self, *args, **options):
+        images, stems = self.get_referenced()
+        deadline = timezone.now() - timedelta(minutes=options['min_age'])
+        removed = size = 0
+        for storage, name in self.get_garbage(images, stems):
+            if storage.get_modified_time(name) >= deadline:
+                continue
+            size += storage.size(name)
+            removed += 1
+            if not options['dry_run']:
+                storage.delete(name)
+        message = (
+            f'Неиспользуемых файлов: {removed}, '
+            f'объём: {filesizeformat(size)}'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'{message}. Пробный запуск: файлы не удалены.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Удалено. {message}'))
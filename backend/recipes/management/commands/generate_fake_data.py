@@ -0,0 +1,307 @@
+import io
+import random
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.db.models.functions import Now
+from django.utils import timezone
+from PIL import Image
+
+from foodgram.versions import bump_version
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipes, Recipe, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+PREFIX = 'fake-'
+PASSWORD = 'fake-password'
+COLORS = ('#E26C2D', '#49B64E', '#8775D2', '#F2C94C', '#2F80ED')
+PUB_DATE_STEP = timedelta(minutes=17)
+
+
+class Zipf:
+    """Выбор элементов с вероятностью, обратной степени ранга.
+
+    Элементы перемешиваются, чтобы популярность не зависела от их
+    порядка в базе.
+    """
+
+    def __init__(self, population, skew, generator):
+        self.population = list(population)
+        generator.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(self.population) + 1)
+        ))
+        self.generator = generator
+
+    def choices(self, k):
+        return self.generator.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        )
+
+    def sample(self, k):
+        """Возвращает k разных элементов."""
+        k = min(k, len(self.population))
+        result = {}
+        while len(result) < k:
+            result.update(dict.fromkeys(self.choices(k - len(result))))
+        return list(result)
+
+
+def batched(iterable, size):
+    """Разбивает последовательность на списки длины size."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетических пользователей, рецепты, избранное, корзины '
+        'и подписки для нагрузочных замеров. Авторы, рецепты и '
+        'ингредиенты выбираются по закону Ципфа: немногие популярны, '
+        'большинство встречается редко.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 1000, 'Количество пользователей.'),
+            ('recipes', 10000, 'Количество рецептов.'),
+            ('favorites', 50000, 'Количество добавлений в избранное.'),
+            ('carts', 10000, 'Количество добавлений в корзину.'),
+            ('subscriptions', 10000, 'Количество подписок.'),
+            ('max-ingredients', 12, 'Наибольшее число ингредиентов рецепта.'),
+            ('seed', 0, 'Начальное значение генератора случайных чисел.'),
+            ('batch-size', 5000, 'Количество строк в одной пачке.'),
+        ):
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help_text
+            )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель степени распределения популярности.'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданные синтетические данные.'
+        )
+
+    def clear(self):
+        """Удаляет синтетических пользователей вместе с их данными."""
+        deleted = sum(
+            model.objects.filter(**{lookup: PREFIX}).delete()[0]
+            for model, lookup in (
+                (User, 'username__startswith'),
+                (Tag, 'slug__startswith'),
+            )
+        )
+        bump_version('recipes', 'tags', 'users')
+        self.stdout.write(f'Удалено записей: {deleted}')
+
+    def get_image(self):
+        """Сохраняет общее изображение рецептов и возвращает его имя."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), '#E26C2D').save(buffer, 'PNG')
+        image_field = Recipe._meta.get_field('image')
+        return image_field.storage.save(
+            f'{image_field.upload_to}/fake.png',
+            ContentFile(buffer.getvalue())
+        )
+
+    def get_tags(self):
+        """Возвращает теги, создавая недостающие до пяти."""
+        tags = list(Tag.objects.all())
+        for index in range(len(tags), len(COLORS)):
+            tags.append(Tag.objects.create(
+                name=f'Тег {index + 1}',
+                color=COLORS[index],
+                slug=f'{PREFIX}{index + 1}'
+            ))
+        return tags
+
+    def create_users(self, total, batch_size):
+        """Создаёт пользователей с общим паролем."""
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        password = make_password(PASSWORD)
+        users = (
+            User(
+                username=f'{PREFIX}{index}',
+                email=f'{PREFIX}{index}@example.com',
+                first_name=f'Имя {index}',
+                last_name=f'Фамилия {index}',
+                password=password,
+            )
+            for index in range(start, start + total)
+        )
+        return [
+            user.id
+            for batch in batched(users, batch_size)
+            for user in User.objects.bulk_create(batch)
+        ]
+
+    def create_recipes(self, options, generator, authors, image):
+        """Создаёт рецепты с ингредиентами и тегами."""
+        ingredients = Zipf(
+            Ingredient.objects.values_list('id', 'name'),
+            options['skew'], generator
+        )
+        tag_ids = [tag.id for tag in self.get_tags()]
+        recipe_ids = []
+        for batch in batched(
+            authors.choices(options['recipes']), options['batch_size']
+        ):
+            compositions = [
+                ingredients.sample(
+                    generator.randint(2, options['max_ingredients'])
+                )
+                for _ in batch
+            ]
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author_id=author_id,
+                    name=' с '.join(
+                        name for _, name in composition[:2]
+                    )[:200],
+                    text='Смешать: {}.'.format(
+                        ', '.join(name for _, name in composition)
+                    )[:1000],
+                    cooking_time=generator.randint(5, 180),
+                    image=image,
+                )
+                for author_id, composition in zip(batch, compositions)
+            )
+            IngredientRecipes.objects.bulk_create(
+                IngredientRecipes(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=generator.randint(1, 500)
+                )
+                for recipe, composition in zip(recipes, compositions)
+                for ingredient_id, _ in composition
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in generator.sample(
+                    tag_ids, generator.randint(1, len(tag_ids))
+                )
+            )
+            recipe_ids.extend(recipe.id for recipe in recipes)
+        self.spread_pub_dates(recipe_ids, options['batch_size'])
+        return recipe_ids
+
+    def spread_pub_dates(self, recipe_ids, size):
+        """Разносит даты публикации новых рецептов по прошлому.
+
+        Рецепт тем старше, чем меньше его идентификатор: на PUB_DATE_STEP
+        за каждый следующий идентификатор.
+        """
+        if not recipe_ids:
+            return
+        last_id = max(recipe_ids)
+        for batch in batched(recipe_ids, size):
+            Recipe.objects.filter(pk__in=batch).update(
+                pub_date=Now() - ExpressionWrapper(
+                    (last_id - F('id')) * PUB_DATE_STEP,
+                    output_field=DurationField()
+                )
+            )
+
+    def create_pairs(self, model, fields, users, targets, total, size,
+                     get_created=None):
+        """Создаёт уникальные пары пользователь и цель без повторов.
+
+        get_created возвращает дату добавления по идентификатору цели.
+        Возвращает число действительно добавленных строк: пары, которые
+        уже есть в базе, пропускаются.
+        """
+        pairs = dict.fromkeys(
+            (user_id, target_id)
+            for user_id, target_id in zip(
+                users.choices(total), targets.choices(total)
+            )
+            if user_id != target_id or fields[1] != 'author_id'
+        )
+
+        def build(pair):
+            instance = model(**dict(zip(fields, pair)))
+            if get_created is not None:
+                instance.created = get_created(pair[1])
+            return instance
+
+        before = model.objects.count()
+        for batch in batched(pairs, size):
+            model.objects.bulk_create(
+                (build(pair) for pair in batch), ignore_conflicts=True
+            )
+        return model.objects.count() - before
+
+    @transaction.atomic
+    def generate(self, options):
+        generator = random.Random(options['seed'])
+        skew, size = options['skew'], options['batch_size']
+        if not Ingredient.objects.exists():
+            raise CommandError('Нет ингредиентов, выполните load_data.')
+        user_ids = self.create_users(options['users'], size)
+        if not user_ids:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        authors = Zipf(user_ids, skew, generator)
+        readers = Zipf(user_ids, skew / 2, generator)
+        recipe_ids = self.create_recipes(
+            options, generator, authors, self.get_image()
+        )
+        self.stdout.write(
+            f'Пользователей: {len(user_ids)}, рецептов: {len(recipe_ids)}'
+        )
+        if not recipe_ids:
+            return
+        bump_version('recipes', 'users')
+        recipes = Zipf(recipe_ids, skew, generator)
+        now, last_id = timezone.now(), max(recipe_ids)
+
+        def get_created(recipe_id):
+            """Случайный момент между публикацией рецепта и текущим."""
+            age = (last_id - recipe_id) * PUB_DATE_STEP
+            return now - generator.random() * age
+
+        for model, fields, targets, total, created_at in (
+            (Favorite, ('user_id', 'recipe_id'), recipes,
+             options['favorites'], get_created),
+            (ShoppingCart, ('user_id', 'recipe_id'), recipes,
+             options['carts'], get_created),
+            (Subscription, ('user_id', 'author_id'), authors,
+             options['subscriptions'], None),
+        ):
+            created = self.create_pairs(
+                model, fields, readers, targets, total, size, created_at
+            )
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {created}'
+            )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+            return
+        self.generate(options)
+        for command, kwargs in (
+            ('recount_counters', {}),
+            ('update_search_index', {'missing': True}),
+            ('refresh_recipe_scores', {'full': True}),
+        ):
+            call_command(command, stdout=self.stdout, **kwargs)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пароль пользователей {PREFIX}N: {PASSWORD}'
+        ))
@@ -1,54 +1,178 @@
 import csv
+import json
 import os
-import logging
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from foodgram.versions import bump_version
+from recipes.autocomplete import ingredient_autocomplete
 from recipes.models import Ingredient, Tag
 
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(data_file):
+    """Построчно читает ингредиенты из CSV-файла."""
+    for row in csv.reader(data_file):
+        yield row[:2] if len(row) >= 2 else None
+
+
+def read_json(data_file):
+    """Потоково читает массив ингредиентов из JSON-файла."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = data_file.read(JSON_CHUNK_SIZE)
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != '[':
+                    raise CommandError('JSON-файл должен содержать массив')
+                buffer = buffer[1:]
+                started = True
+                continue
+            buffer = buffer.lstrip(', \n\r\t')
+            if not buffer or buffer[0] == ']':
+                break
+            try:
+                data_object, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Некорректный JSON-файл')
+                break
+            buffer = buffer[end:]
+            try:
+                yield [data_object['name'], data_object['measurement_unit']]
+            except (KeyError, TypeError):
+                yield None
+        if not chunk:
+            return
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты и теги в базу данных.'
     DATA_FILE = 'ingredients.csv'
+    TAGS = [
+        {'name': 'Завтрак', 'slug': 'breakfast', 'color': '#87CEEB'},
+        {'name': 'Обед', 'slug': 'lunch', 'color': '#98FF98'},
+        {'name': 'Ужин', 'slug': 'dinner', 'color': '#E6E6FA'},
+    ]
 
-    def import_from_csv_file(self):
-        data_file_path = os.path.join(os.path.dirname(os.getcwd()), 'app',
-                                      self.DATA_FILE)
-        logging.info(f'Importing data from {data_file_path}')
-
-        with open(data_file_path, encoding='utf-8') as data_file:
-            data = csv.reader(data_file)
-            for data_object in data:
-                name, measurement_unit = data_object[:2]
-
-                try:
-                    ingredient, created = Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit,
-                    )
-                    if created:
-                        ingredient.save()
-                        logging.info(f'Ingredient "{ingredient}" saved.')
-                except Exception as ex:
-                    logging.error(f'Error saving ingredient {name}: {str(ex)}')
-
-        self.create_tags()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, self.DATA_FILE),
+            help='Путь к файлу ingredients.csv или ingredients.json.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной пачке bulk_create.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Выполнить загрузку и откатить транзакцию.'
+        )
 
-    def create_tags(self):
-        tags = [
-            {'name': 'Завтрак', 'slug': 'breakfast', 'color': '#87CEEB'},
-            {'name': 'Обед', 'slug': 'lunch', 'color': '#98FF98'},
-            {'name': 'Ужин', 'slug': 'dinner', 'color': '#E6E6FA'},
-        ]
+    def read_ingredients(self, path, stats):
+        """Возвращает уникальные корректные ингредиенты из файла."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError(
+                f'Неподдерживаемый формат файла: {extension}'
+            )
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit'
+        ).max_length
+        seen = set()
+        with open(path, encoding='utf-8') as data_file:
+            for row in READERS[extension](data_file):
+                stats['read'] += 1
+                if row is None:
+                    stats['failed'] += 1
+                    continue
+                name, measurement_unit = (str(value).strip() for value in row)
+                if (
+                    not name or not measurement_unit
+                    or len(name) > name_length
+                    or len(measurement_unit) > unit_length
+                ):
+                    stats['failed'] += 1
+                    continue
+                if (name, measurement_unit) in seen:
+                    continue
+                seen.add((name, measurement_unit))
+                yield Ingredient(
+                    name=name,
+                    measurement_unit=measurement_unit
+                )
 
-        for tag_data in tags:
-            try:
-                Tag.objects.get_or_create(**tag_data)
-            except Exception as ex:
-                logging.error(
-                    f'Error creating tag {tag_data["name"]}: {str(ex)}')
+    def import_ingredients(self, path, batch_size):
+        """Загружает ингредиенты пачками, пропуская существующие."""
+        stats = {'read': 0, 'failed': 0}
+        count_before = Ingredient.objects.count()
+        ingredients = self.read_ingredients(path, stats)
+        while True:
+            batch = list(islice(ingredients, batch_size))
+            if not batch:
+                break
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        stats['inserted'] = Ingredient.objects.count() - count_before
+        stats['skipped'] = stats['read'] - stats['failed'] - stats['inserted']
+        return stats
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(**tag_data) for tag_data in self.TAGS],
+            ignore_conflicts=True
+        )
 
     def handle(self, *args, **options):
-        logging.basicConfig(level=logging.INFO,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
-        self.import_from_csv_file()
-        self.stdout.write(self.style.SUCCESS('Импорт завершен успешно.'))
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            stats = self.import_ingredients(path, options['batch_size'])
+            self.create_tags()
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+
+        if not options['dry_run']:
+            ingredient_autocomplete.invalidate()
+            bump_version('tags')
+        self.stdout.write(
+            'Прочитано: {read}, добавлено: {inserted}, '
+            'пропущено: {skipped}, с ошибками: {failed}'.format(**stats)
+        )
+        self.stdout.write(
+            f'Время: {elapsed:.2f} с, '
+            f'скорость: {stats["read"] / max(elapsed, 1e-9):.0f} строк/с'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                'Пробный запуск: изменения не сохранены.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Импорт завершен успешно.'))
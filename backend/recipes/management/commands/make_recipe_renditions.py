@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import make_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные копии изображений рецептов, '
+        'для которых их ещё нет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(renditions={})
+        created = failed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                make_renditions(recipe_id, overwrite=options['all'])
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+            else:
+                created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {created}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+def actual_count(model, field):
+    """Возвращает подзапрос с фактическим числом связанных записей."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, корзины, рецептов и подписок.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, counter, related_model, field in COUNTERS:
+                actual = actual_count(related_model, field)
+                updated = model.objects.exclude(
+                    **{counter: actual}
+                ).update(**{counter: actual})
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}.{counter}: '
+                    f'исправлено {updated}'
+                )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
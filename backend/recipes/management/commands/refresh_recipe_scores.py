@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import refresh_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярности рецептов, у которых с прошлого '
+        'запуска изменились избранное или корзина. Предназначена для '
+        'запуска по расписанию. Рецептам, добавленным в обход сигналов, '
+        'создаётся пустой рейтинг.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help=(
+                'Пересчитать рейтинг по всем событиям с нуля, например '
+                'после удаления событий в обход сигналов.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        stats = refresh_scores(full=options['full'])
+        self.stdout.write(
+            'Учтено событий: избранное {favorite}, корзина {shopping_cart}; '
+            'обновлено рецептов: {recipes}'.format(**stats)
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает поисковые векторы и списки ингредиентов рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Пересчитать только рецепты без поискового вектора.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['missing']:
+            recipes = recipes.filter(search_vector__isnull=True)
+        updated = recipes.update_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated}'
+        ))
@@ -1,8 +1,45 @@
+from django.contrib.postgres.aggregates import ArrayAgg, StringAgg
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField
+)
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models import (
+    Case, Exists, F, Func, IntegerField, OuterRef, Prefetch, Q, Subquery,
+    Value, When
+)
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
 
 from users.models import User
 
+from .storage import ContentAddressedStorage
+
+SEARCH_CONFIG = 'russian'
+# Оценка рейтинга рецепта без событий.
+NO_SCORE = float('-inf')
+
+
+class IngredientQuerySet(models.QuerySet):
+    """Набор запросов ингредиентов."""
+
+    def search(self, query):
+        """Ищет ингредиенты: сначала по началу названия, затем по вхождению.
+
+        istartswith и icontains сравнивают UPPER(name), поэтому поиск
+        обслуживают индексы по этому выражению: B-tree с text_pattern_ops
+        для начала названия и триграммный GIN для вхождения.
+        """
+        return self.filter(name__icontains=query).annotate(
+            is_prefix=Case(
+                When(Q(name__istartswith=query), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            )
+        ).order_by('-is_prefix', 'name')
+
 
 class Ingredient(models.Model):
     """Ингредиенты для рецептов."""
@@ -15,10 +52,28 @@ class Ingredient(models.Model):
         max_length=200,
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_prefix_idx'
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit'
+            )
+        ]
 
     def __str__(self):
         """Возвращает строковое представление ингредиента."""
@@ -56,6 +111,145 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    def with_user_flags(self, user):
+        """Добавляет флаги избранного, корзины и подписки на автора."""
+        author_queryset = User.objects.with_is_subscribed(user)
+        if user.is_authenticated:
+            flags = {
+                'is_favorited': Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            }
+        else:
+            flags = {
+                'is_favorited': Value(False, models.BooleanField()),
+                'is_in_shopping_cart': Value(False, models.BooleanField()),
+            }
+        return self.annotate(**flags).prefetch_related(
+            Prefetch('author', queryset=author_queryset)
+        )
+
+    def latest_per_author(self, limit=None):
+        """Оставляет не более limit последних рецептов каждого автора."""
+        if limit is None:
+            return self
+        return self.filter(pk__in=Subquery(
+            self.model.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:limit]
+        ))
+
+    def update_search_index(self):
+        """Пересчитывает поисковый вектор и список ингредиентов рецептов."""
+        ingredients = IngredientRecipes.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe')
+        ingredient_names = ingredients.annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        ingredient_ids = ingredients.annotate(
+            ids=ArrayAgg('ingredient_id', ordering='ingredient_id')
+        ).values('ids')
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(
+                    Subquery(ingredient_names), weight='B',
+                    config=SEARCH_CONFIG
+                )
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+            ),
+            ingredient_ids=Coalesce(Subquery(ingredient_ids), Value([]))
+        )
+
+    def with_tag_ids(self):
+        """Добавляет идентификаторы тегов рецепта из связующей таблицы."""
+        tag_ids = self.model.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        ).order_by().values('recipe_id').annotate(
+            ids=ArrayAgg('tag_id')
+        ).values('ids')
+        return self.annotate(tag_ids=Coalesce(
+            Subquery(tag_ids), Value([]),
+            output_field=ArrayField(models.BigIntegerField())
+        ))
+
+    def with_tags(self, tag_ids, match_all=False):
+        """Рецепты с любым из тегов или, при match_all, со всеми тегами.
+
+        Условие строится подзапросом EXISTS по связующей таблице, поэтому
+        рецепты не дублируются и DISTINCT не нужен.
+        """
+        through = self.model.tags.through
+        if not match_all:
+            return self.filter(Exists(through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+            )))
+        queryset = self
+        for tag_id in tag_ids:
+            queryset = queryset.filter(Exists(through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id=tag_id
+            )))
+        return queryset
+
+    def with_ingredients(self, ingredient_ids, max_missing=None):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Если задан max_missing, остаются рецепты, которым не хватает
+        не больше max_missing ингредиентов, и ближайшие идут первыми.
+        """
+        ingredient_ids = sorted(set(ingredient_ids))
+        queryset = self.filter(ingredient_ids__overlap=ingredient_ids)
+        if max_missing is None:
+            return queryset
+        matched = sum(
+            (
+                Case(
+                    When(ingredient_ids__contains=[ingredient_id], then=1),
+                    default=0,
+                    output_field=IntegerField()
+                )
+                for ingredient_id in ingredient_ids
+            ),
+            Value(0)
+        )
+        return queryset.alias(
+            missing=Func(
+                'ingredient_ids', function='cardinality',
+                output_field=IntegerField()
+            ) - matched
+        ).filter(missing__lte=max_missing).order_by(
+            'missing', '-pub_date', '-id'
+        )
+
+    def search(self, query, limit=None):
+        """Ищет рецепты по тексту и сортирует их по релевантности.
+
+        По умолчанию ранжируются все совпадения, а ограничивается только
+        страница выдачи. Если задан limit (RECIPE_SEARCH_LIMIT), ранжируются
+        лишь limit самых новых совпадений: для частых слов база не считает
+        ts_rank по всем найденным рецептам, но более старые рецепты не
+        попадают в выдачу, как бы точно они ни совпадали.
+        """
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        matches = self.filter(search_vector=search_query)
+        if limit:
+            matches = self.filter(pk__in=Subquery(
+                matches.order_by('-pub_date', '-id').values('pk')[:limit]
+            ))
+        return matches.annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+
+
 class Recipe(models.Model):
     """Рецепты."""
     author = models.ForeignKey(
@@ -71,6 +265,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to='recipes/images',
+        storage=ContentAddressedStorage()
     )
     text = models.TextField(
         'Описание',
@@ -97,16 +292,51 @@ class Recipe(models.Model):
         'Дата и время публикации рецепта',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        'Количество добавлений в корзину',
+        default=0,
+        editable=False
+    )
+    renditions = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(),
+        verbose_name='Идентификаторы ингредиентов',
+        default=list,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
 
-    def faivorites_count(self):
-        return self.favorites.count()
-
-    faivorites_count.short_description = 'Количество добавлений в избранное'
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'], name='recipe_search_vector_idx'
+            ),
+            GinIndex(
+                fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'
+            ),
+        ]
 
     def __str__(self):
         """Возвращает строковое представление рецепта."""
@@ -164,6 +394,10 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now
+    )
 
     # def users_count(self):
     #     return self.recipe.favorites.count()
@@ -198,6 +432,10 @@ class ShoppingCart(models.Model):
         related_name='cart',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now
+    )
 
     class Meta:
         verbose_name = 'Корзина покупок'
@@ -213,3 +451,63 @@ class ShoppingCart(models.Model):
     def __str__(self):
         """Возвращает строковое представление рецепта в корзине."""
         return f'{self.user} добавил {self.recipe} в корзину покупок'
+
+
+class RecipeScore(models.Model):
+    """Рейтинг популярности рецепта.
+
+    Оценки хранятся в логарифмической шкале с прямым затуханием
+    относительно фиксированной эпохи, поэтому не устаревают со временем
+    и пересчитываются только для рецептов с изменившимися событиями.
+    events — число событий, по которым посчитана оценка. Рейтинг есть у
+    каждого рецепта, а рецепт без событий получает NO_SCORE (логарифм
+    нуля), поэтому сортировка по рейтингу идёт по индексу через
+    внутреннее соединение. events_removed — время последнего удаления
+    события рецепта, по нему пересчёт находит уменьшившиеся оценки.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+    popular = models.FloatField('Популярность', default=NO_SCORE)
+    trending = models.FloatField('В тренде', default=NO_SCORE)
+    events = models.PositiveIntegerField('Учтено событий', default=0)
+    events_removed = models.DateTimeField(
+        'Время удаления события', null=True, db_index=True
+    )
+    updated = models.DateTimeField('Дата пересчёта', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popular', '-recipe'],
+                name='recipe_score_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending', '-recipe'],
+                name='recipe_score_trending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        """Возвращает строковое представление рейтинга."""
+        return f'{self.recipe}: {self.popular}, {self.trending}'
+
+
+class RecipeScoreWatermark(models.Model):
+    """Время последнего пересчёта рейтинга."""
+    source = models.CharField('Источник', max_length=50, unique=True)
+    checked_at = models.DateTimeField('Время пересчёта', null=True)
+
+    class Meta:
+        verbose_name = 'Отметка пересчёта рейтинга'
+        verbose_name_plural = 'Отметки пересчёта рейтинга'
+
+    def __str__(self):
+        """Возвращает строковое представление отметки."""
+        return f'{self.source}: {self.checked_at}'
@@ -0,0 +1,178 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.versions import bump_version
+from .models import (
+    NO_SCORE, Favorite, Recipe, RecipeScore, RecipeScoreWatermark,
+    ShoppingCart
+)
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HALF_LIVES = {
+    'popular': timedelta(days=7),
+    'trending': timedelta(days=1),
+}
+EVENT_SOURCES = {
+    'favorite': (Favorite, 1.0),
+    'shopping_cart': (ShoppingCart, 0.5),
+}
+ITERATOR_CHUNK_SIZE = 2000
+WATERMARK_SOURCE = 'events'
+# Запас на транзакции, которые создали событие до пересчёта, а
+# зафиксировали после него.
+WINDOW_OVERLAP = timedelta(minutes=10)
+
+
+def log_add(first, second):
+    """Складывает два числа, заданных натуральными логарифмами."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def event_score(weight, created, half_life):
+    """Возвращает логарифм вклада события с прямым затуханием."""
+    age = (created - EPOCH) / half_life
+    return math.log(weight) + age * math.log(2)
+
+
+def get_changed_recipes(since):
+    """Возвращает рецепты, события которых могли измениться после since.
+
+    Это рецепты с событиями, созданными начиная с since, и рецепты,
+    у которых с since удалялись события. Удаления в обход сигналов
+    учитывает только полный пересчёт.
+    """
+    recipe_ids = set()
+    for model, _ in EVENT_SOURCES.values():
+        recipe_ids.update(
+            model.objects.filter(created__gte=since).values_list(
+                'recipe_id', flat=True
+            ).distinct()
+        )
+    recipe_ids.update(
+        RecipeScore.objects.filter(events_removed__gte=since).values_list(
+            'recipe_id', flat=True
+        )
+    )
+    return recipe_ids
+
+
+def collect_scores(recipe_ids=None):
+    """Считает оценки рецептов по всем их событиям.
+
+    Возвращает оценки и число событий по рецептам и число событий по
+    источникам. Без recipe_ids учитываются все рецепты.
+    """
+    scores = defaultdict(dict)
+    events = defaultdict(int)
+    stats = {}
+    for source, (model, weight) in EVENT_SOURCES.items():
+        queryset = model.objects.all()
+        if recipe_ids is not None:
+            queryset = queryset.filter(recipe_id__in=recipe_ids)
+        stats[source] = 0
+        for recipe_id, created in queryset.values_list(
+            'recipe_id', 'created'
+        ).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            for field, half_life in HALF_LIVES.items():
+                scores[recipe_id][field] = log_add(
+                    scores[recipe_id].get(field),
+                    event_score(weight, created, half_life)
+                )
+            events[recipe_id] += 1
+            stats[source] += 1
+    return scores, events, stats
+
+
+def create_missing_scores():
+    """Создаёт пустой рейтинг рецептам, добавленным без сигналов.
+
+    Например, bulk_create в generate_fake_data не вызывает post_save.
+    """
+    RecipeScore.objects.bulk_create(
+        [
+            RecipeScore(recipe_id=recipe_id)
+            for recipe_id in Recipe.objects.filter(
+                score__isnull=True
+            ).values_list('id', flat=True)
+        ],
+        batch_size=ITERATOR_CHUNK_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def reset_scores(queryset):
+    """Сбрасывает рейтинг рецептов, у которых не осталось событий."""
+    queryset.exclude(events=0).update(
+        events=0, **{field: NO_SCORE for field in HALF_LIVES}
+    )
+
+
+def save_scores(recipe_ids, scores, events):
+    """Заменяет оценки рецептов новыми.
+
+    Оценки рецептов, у которых не осталось событий, сбрасываются.
+    """
+    reset_scores(RecipeScore.objects.filter(recipe_id__in=recipe_ids).exclude(
+        recipe_id__in=list(scores)
+    ))
+    existing = RecipeScore.objects.in_bulk(list(scores))
+    changed, created = [], []
+    for recipe_id, values in scores.items():
+        score = existing.get(recipe_id)
+        if score is None:
+            created.append(RecipeScore(
+                recipe_id=recipe_id, events=events[recipe_id], **values
+            ))
+            continue
+        for field, value in values.items():
+            setattr(score, field, value)
+        score.events = events[recipe_id]
+        changed.append(score)
+    RecipeScore.objects.bulk_create(created, batch_size=ITERATOR_CHUNK_SIZE)
+    RecipeScore.objects.bulk_update(
+        changed, [*HALF_LIVES, 'events'], batch_size=ITERATOR_CHUNK_SIZE
+    )
+
+
+@transaction.atomic
+def refresh_scores(full=False):
+    """Пересчитывает рейтинг рецептов, события которых изменились.
+
+    Оценка рецепта складывается из добавлений в избранное и корзину,
+    вклад каждого события затухает с периодом полураспада из HALF_LIVES.
+    Оценки изменившихся рецептов пересчитываются по всем их событиям,
+    поэтому удаление из избранного или корзины уменьшает оценку, а
+    повторно прочитанное событие не учитывается дважды. Окно поиска
+    новых событий начинается раньше прошлого пересчёта на WINDOW_OVERLAP:
+    события из транзакций, зафиксированных позже, тоже попадут в рейтинг.
+    """
+    started = timezone.now()
+    watermark, _ = RecipeScoreWatermark.objects.select_for_update(
+    ).get_or_create(source=WATERMARK_SOURCE)
+    if full or watermark.checked_at is None:
+        recipe_ids = None
+    else:
+        recipe_ids = list(
+            get_changed_recipes(watermark.checked_at - WINDOW_OVERLAP)
+        )
+    create_missing_scores()
+    scores, events, stats = collect_scores(recipe_ids)
+    if recipe_ids is None:
+        reset_scores(RecipeScore.objects.exclude(recipe_id__in=list(scores)))
+        recipe_ids = list(scores)
+    save_scores(recipe_ids, scores, events)
+    watermark.checked_at = started
+    watermark.save(update_fields=['checked_at'])
+    if recipe_ids:
+        bump_version('scores')
+    stats['recipes'] = len(recipe_ids)
+    return stats
@@ -0,0 +1,146 @@
+from django.db import connections, transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_migrate
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from foodgram.versions import bump_version
+from users.models import User
+from users.signals import change_counter
+
+from .autocomplete import ingredient_autocomplete
+from .tags import tag_registry
+from .models import (
+    Favorite, Ingredient, IngredientRecipes, Recipe, RecipeScore,
+    ShoppingCart, Tag
+)
+
+COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'carts_count',
+}
+
+
+@receiver(pre_migrate)
+def create_trigram_extension(sender, using, **kwargs):
+    """Подключает pg_trgm до создания триграммного индекса ингредиентов."""
+    connection = connections[using]
+    if sender.name == 'recipes' and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    """Сбрасывает кэш ингредиентов при изменении таблицы."""
+    ingredient_autocomplete.invalidate()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    """Увеличивает счётчик избранного или корзины рецепта."""
+    if created:
+        change_counter(Recipe, instance.recipe_id, COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """Уменьшает счётчик избранного или корзины рецепта."""
+    change_counter(Recipe, instance.recipe_id, COUNTERS[sender], -1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def mark_score_event_removed(sender, instance, **kwargs):
+    """Отмечает рейтинг рецепта для пересчёта после удаления события."""
+    RecipeScore.objects.filter(recipe_id=instance.recipe_id).update(
+        events_removed=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    """Увеличивает счётчик рецептов автора."""
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(sender, instance, created, raw=False, **kwargs):
+    """Создаёт пустой рейтинг нового рецепта."""
+    if created and not raw:
+        RecipeScore.objects.create(recipe=instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Уменьшает счётчик рецептов автора."""
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, using, **kwargs):
+    """Пересчитывает поисковые данные сохранённого рецепта.
+
+    Пересчёт откладывается до фиксации транзакции и выполняется один раз:
+    к этому моменту API и админка уже сохранили ингредиенты рецепта.
+    Каждое сохранение откладывает свой вызов, а множество ожидающих
+    рецептов соединения пропускает повторы. После отката Django
+    отбрасывает отложенные вызовы, и следующее сохранение запланирует
+    пересчёт заново.
+    """
+    connection = connections[using]
+    if not hasattr(connection, 'pending_search_index'):
+        connection.pending_search_index = set()
+    pending = connection.pending_search_index
+    recipe_id = instance.pk
+    pending.add(recipe_id)
+
+    def update():
+        if recipe_id not in pending:
+            return
+        pending.discard(recipe_id)
+        Recipe.objects.filter(pk=recipe_id).update_search_index()
+
+    transaction.on_commit(update, using=using)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_index(sender, instance, created, **kwargs):
+    """Пересчитывает поисковые данные рецептов с ингредиентом."""
+    if not created:
+        Recipe.objects.filter(
+            ingredient_ids__contains=[instance.pk]
+        ).update_search_index()
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_ingredient_from_search_index(sender, instance, **kwargs):
+    """Убирает удалённый ингредиент из поисковых данных рецептов."""
+    Recipe.objects.filter(
+        ingredient_ids__contains=[instance.pk]
+    ).update_search_index()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipes)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(**kwargs):
+    """Отмечает изменение рецептов для HTTP-кэширования."""
+    bump_version('recipes')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сбрасывает реестр тегов во всех процессах и HTTP-кэш тегов."""
+    tag_registry.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def bump_user_version(sender, instance, **kwargs):
+    """Отмечает изменение избранного или корзины пользователя."""
+    bump_version(f'user:{instance.user_id}')
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import posixpath
+from uuid import uuid4
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 их содержимого.
+
+    Файлы раскладываются по подкаталогам из первых двух символов хэша.
+    Повторная загрузка того же содержимого не записывает файл заново,
+    а только обновляет время его изменения, чтобы gc_media не удалил
+    файл, на который вот-вот сошлётся новая запись. Запись идёт во
+    временный файл с последующим атомарным переименованием, поэтому
+    одновременная загрузка того же содержимого лишь заменяет файл
+    таким же.
+    """
+
+    def get_digest(self, content):
+        """Возвращает хэш содержимого файла."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def get_content_name(self, name, content):
+        """Строит имя файла из каталога, хэша и расширения."""
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = self.get_digest(content)
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        """Оставляет имя как есть: по нему уже лежит то же содержимое."""
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        temporary = super()._save(
+            posixpath.join(directory, f'.{uuid4().hex}.tmp'), content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
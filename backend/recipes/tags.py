@@ -0,0 +1,47 @@
+from foodgram.versions import VersionedSnapshot
+
+from .models import Tag
+
+
+class TagRegistry(VersionedSnapshot):
+    """Теги в памяти процесса.
+
+    Снимок перечитывается, когда меняется версия tags в общем кэше
+    версий или истекает TAG_CACHE_TTL. Теги в снимке идут в порядке
+    сортировки модели.
+    """
+    version_name = 'tags'
+    ttl_setting = 'TAG_CACHE_TTL'
+
+    def build(self):
+        tags = list(Tag.objects.all())
+        return {
+            'tags': tags,
+            'by_id': {tag.id: tag for tag in tags},
+            'by_slug': {tag.slug: tag for tag in tags},
+        }
+
+    def all(self):
+        """Возвращает все теги."""
+        return self.get()['tags']
+
+    def get_slugs(self):
+        """Возвращает слаги всех тегов."""
+        return list(self.get()['by_slug'])
+
+    def get_ids(self, slugs):
+        """Возвращает идентификаторы тегов по слагам."""
+        by_slug = self.get()['by_slug']
+        return [by_slug[slug].id for slug in slugs if slug in by_slug]
+
+    def get_by_id(self, tag_id):
+        """Возвращает тег по идентификатору или None."""
+        return self.get()['by_id'].get(tag_id)
+
+    def get_tags(self, tag_ids):
+        """Возвращает теги по идентификаторам в порядке сортировки."""
+        tag_ids = set(tag_ids)
+        return [tag for tag in self.all() if tag.id in tag_ids]
+
+
+tag_registry = TagRegistry()
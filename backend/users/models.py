@@ -1,5 +1,24 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
+
+
+class UserQuerySet(models.QuerySet):
+    """Набор запросов пользователей."""
+
+    def with_is_subscribed(self, user):
+        """Добавляет флаг подписки пользователя на автора."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_subscribed=Value(False, models.BooleanField())
+            )
+        return self.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с дополнительными аннотациями."""
 
 
 class User(AbstractUser):
@@ -24,14 +43,21 @@ class User(AbstractUser):
         null=False
     )
 
-    USERNAME_FIELD = 'email'
-    REQUIRED_FIELDS = ['username']
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
-    @property
-    def subscription_count(self):
-        return self.subscribing.count()
+    objects = CustomUserManager()
 
-    subscription_count.fget.short_description = 'Количество подписок на автора'
+    USERNAME_FIELD = 'email'
+    REQUIRED_FIELDS = ['username']
 
     class Meta:
         verbose_name = 'Пользователь'
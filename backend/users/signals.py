@@ -0,0 +1,41 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.versions import bump_version
+from .models import Subscription, User
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик объекта на delta."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(sender, instance, created, **kwargs):
+    """Увеличивает счётчик подписчиков автора."""
+    if created:
+        change_counter(User, instance.author_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(sender, instance, **kwargs):
+    """Уменьшает счётчик подписчиков автора."""
+    change_counter(User, instance.author_id, 'subscribers_count', -1)
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def bump_subscriber_version(sender, instance, **kwargs):
+    """Отмечает изменение подписок пользователя."""
+    bump_version(f'user:{instance.user_id}')
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_users_version(sender, instance, update_fields=None, **kwargs):
+    """Отмечает изменение данных пользователей, кроме времени входа."""
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version('users')